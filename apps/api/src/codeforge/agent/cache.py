@@ -7,6 +7,7 @@ from typing import Any
 #   1. SYSTEM_PROMPT — never interpolate session ids, timestamps, or user names
 #   2. Tool names/descriptions/order — byte-stable in tools.py
 #   3. History — append-only; don't reorder or rewrite prior turns
+#      (compaction.py folds old turns only at stable whole-turn checkpoints)
 
 
 def extract_turn_usage(output: Any) -> dict[str, int]:
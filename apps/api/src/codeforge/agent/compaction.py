@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from codeforge.agent.messages import _summarize_tool_output, _tool_result_error
+
+# Folding happens at whole-turn checkpoints (multiples of step_turns) and is
+# deterministic, so the compacted prefix is byte-identical from run to run
+# until the checkpoint advances — DeepSeek prefix-cache hits survive.
+
+CHARS_PER_TOKEN = 4
+MAX_ARG_CHARS = 200
+
+
+def _content_len(content: Any) -> int:
+    if isinstance(content, str):
+        return len(content)
+    return len(json.dumps(content, default=str))
+
+
+def estimate_tokens(messages: list[BaseMessage]) -> int:
+    chars = 0
+    for m in messages:
+        chars += _content_len(m.content)
+        if isinstance(m, AIMessage) and m.tool_calls:
+            chars += _content_len([tc.get("args", {}) for tc in m.tool_calls])
+    return chars // CHARS_PER_TOKEN
+
+
+def _fold_args(args: Any) -> Any:
+    if not isinstance(args, dict):
+        return args
+    return {
+        k: f"<{len(v)} chars omitted>" if isinstance(v, str) and len(v) > MAX_ARG_CHARS else v
+        for k, v in args.items()
+    }
+
+
+def _fold(message: BaseMessage, tool_names: dict[str, str]) -> BaseMessage:
+    if isinstance(message, ToolMessage):
+        name = tool_names.get(message.tool_call_id, "")
+        return ToolMessage(
+            content=json.dumps({
+                "output": _summarize_tool_output(message.content, name),
+                "isError": _tool_result_error(message.content),
+                "compacted": True,
+            }),
+            tool_call_id=message.tool_call_id,
+        )
+    if isinstance(message, AIMessage) and message.tool_calls:
+        return AIMessage(
+            content=message.content,
+            tool_calls=[{**tc, "args": _fold_args(tc.get("args", {}))} for tc in message.tool_calls],
+        )
+    return message
+
+
+def _fold_before(messages: list[BaseMessage], cut: int) -> list[BaseMessage]:
+    tool_names = {
+        tc.get("id", ""): tc.get("name", "")
+        for m in messages[:cut] if isinstance(m, AIMessage)
+        for tc in m.tool_calls or []
+    }
+    return [_fold(m, tool_names) if i < cut else m for i, m in enumerate(messages)]
+
+
+def compact_history(
+    messages: list[BaseMessage],
+    *,
+    budget_tokens: int,
+    keep_turns: int,
+    step_turns: int,
+) -> tuple[list[BaseMessage], dict[str, int]]:
+    """Fold old tool outputs and large tool-call args until history fits the budget.
+
+    The most recent `keep_turns` user turns are never folded. Returns the
+    (possibly) compacted messages and the estimated token size before/after.
+    """
+    before = estimate_tokens(messages)
+    stats = {"before": before, "after": before}
+    if before <= budget_tokens:
+        return messages, stats
+
+    starts = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+    foldable = len(starts) - keep_turns
+    compacted = messages
+    checkpoint = step_turns
+    while checkpoint <= foldable:
+        # ponytail: keep_turns=0 reaches past the last turn — fold everything
+        cut = starts[checkpoint] if checkpoint < len(starts) else len(messages)
+        compacted = _fold_before(messages, cut)
+        stats["after"] = estimate_tokens(compacted)
+        if stats["after"] <= budget_tokens:
+            break
+        checkpoint += step_turns
+    return compacted, stats
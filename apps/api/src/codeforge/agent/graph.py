@@ -1,17 +1,23 @@
 from __future__ import annotations
 
 import json
-from collections.abc import Callable
-from typing import Any
+import time
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from typing import Any, Optional
 
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 from langgraph.prebuilt import create_react_agent
 
 from codeforge.agent.cache import extract_turn_usage, merge_usage
+from codeforge.agent.compaction import compact_history
 from codeforge.agent.llm import create_llm
 from codeforge.agent.messages import history_to_messages
 from codeforge.agent.prompt import SYSTEM_PROMPT
 from codeforge.agent.tools import build_tools
+from codeforge.config import settings
+from codeforge.metrics import TOOL_DURATION, record_llm_usage
 from codeforge.sandbox import E2BSandbox, normalize_path
 
 AgentEvent = dict[str, Any]
@@ -50,7 +56,7 @@ def _summarize_tool_output(output: str, name: str) -> str:
         text = str(parsed.get("output", output))
     except json.JSONDecodeError:
         text = output
-    cap = 500 if name in ("read_file", "run_command", "check_project", "get_dev_server_logs") else 200
+    cap = 500 if name in ("read_file", "batch_files", "run_command", "check_project", "get_dev_server_logs") else 200
     return text if len(text) <= cap else text[:cap] + "…"
 
 
@@ -63,92 +69,137 @@ def _last_ai_text(messages: list[BaseMessage]) -> str:
     return ""
 
 
+@asynccontextmanager
+async def _checkpointer(thread_id: Optional[str]) -> AsyncIterator[Optional[AsyncSqliteSaver]]:
+    if not thread_id:
+        yield None
+        return
+    async with AsyncSqliteSaver.from_conn_string(settings.checkpoint_path) as saver:
+        yield saver
+
+
+async def discard_checkpoint(thread_id: str) -> None:
+    async with _checkpointer(thread_id) as saver:
+        # ponytail: adelete_thread skips lazy setup — fresh db has no tables yet
+        await saver.setup()
+        await saver.adelete_thread(thread_id)
+
+
 async def run_agent(
     sandbox: E2BSandbox,
     history: list[dict[str, Any]],
     user_message: str,
     emit: Emit,
+    *,
+    thread_id: Optional[str] = None,
 ) -> tuple[list[BaseMessage], dict[str, int]]:
-    llm = create_llm()
-    tools = build_tools(sandbox)
-    agent = create_react_agent(
-        llm,
-        tools,
-        prompt=SystemMessage(content=SYSTEM_PROMPT),
+    """Run one agent turn. With a thread_id every super-step is checkpointed,
+    and a run interrupted mid-way resumes from its last checkpoint."""
+    prior, prompt = compact_history(
+        history_to_messages(history),
+        budget_tokens=settings.history_token_budget,
+        keep_turns=settings.compaction_keep_turns,
+        step_turns=settings.compaction_step_turns,
     )
-
-    input_messages = history_to_messages(history) + [HumanMessage(content=user_message)]
+    if prompt["after"] < prompt["before"]:
+        emit({
+            "type": "status",
+            "message": f"Compacted history ~{prompt['before']} → ~{prompt['after']} tokens",
+        })
+    input_messages = prior + [HumanMessage(content=user_message)]
     usage = {"input": 0, "output": 0, "cacheRead": 0, "cacheMiss": 0}
     pending: dict[str, dict[str, Any]] = {}
     final_messages = input_messages
     streamed_text = ""
 
-    async for event in agent.astream_events(
-        {"messages": input_messages},
-        version="v2",
-        config={"recursion_limit": RECURSION_LIMIT},
-    ):
-        kind = event.get("event")
-
-        if kind == "on_chat_model_stream":
-            chunk = event.get("data", {}).get("chunk")
-            text = _extract_text(getattr(chunk, "content", ""))
-            if text:
-                streamed_text += text
-                emit({"type": "text", "delta": text})
-
-        elif kind == "on_tool_start":
-            run_id = event.get("run_id", "")
-            name = event.get("name", "unknown")
-            inp = event.get("data", {}).get("input", {})
-            pending[run_id] = {"name": name, "input": inp}
-            emit({"type": "tool_start", "id": run_id, "name": name, "input": inp})
-
-        elif kind == "on_tool_end":
-            run_id = event.get("run_id", "")
-            raw = event.get("data", {}).get("output", "")
-            output = _tool_output(raw)
-
-            is_error = False
-            preview_url = None
-            changed_paths: list[str] = []
-            try:
-                parsed = json.loads(output)
-                is_error = parsed.get("isError", False)
-                preview_url = parsed.get("previewUrl")
-                changed_paths = parsed.get("changedPaths", [])
-            except json.JSONDecodeError:
-                pass
-
-            meta = pending.pop(run_id, {})
-            if not changed_paths and meta.get("name") in ("write_file", "edit_file"):
-                path = meta.get("input", {}).get("path")
-                if path:
-                    changed_paths = [path]
-
-            emit({
-                "type": "tool_end",
-                "id": run_id,
-                "output": _summarize_tool_output(output, meta.get("name", "")),
-                "isError": is_error,
-            })
-            if changed_paths:
-                emit({"type": "files_changed", "paths": [normalize_path(p) for p in changed_paths]})
-            if preview_url:
-                emit({"type": "preview", "url": preview_url})
-
-        elif kind == "on_chat_model_end":
-            output = event.get("data", {}).get("output")
-            if output:
-                usage = merge_usage(usage, extract_turn_usage(output))
-
-        elif kind == "on_chain_end" and event.get("name") == "LangGraph":
-            out = event.get("data", {}).get("output", {})
-            if out and "messages" in out:
-                final_messages = out["messages"]
-                tail = _last_ai_text(final_messages)
-                if tail and tail not in streamed_text:
-                    emit({"type": "text", "delta": tail})
-
-    emit({"type": "done", "usage": usage})
+    async with _checkpointer(thread_id) as saver:
+        agent = create_react_agent(
+            create_llm(),
+            build_tools(sandbox),
+            prompt=SystemMessage(content=SYSTEM_PROMPT),
+            checkpointer=saver,
+        )
+        config: dict[str, Any] = {"recursion_limit": RECURSION_LIMIT}
+        graph_input: Optional[dict[str, Any]] = {"messages": input_messages}
+        if saver is not None:
+            config["configurable"] = {"thread_id": thread_id}
+            snapshot = await agent.aget_state(config)
+            saved = snapshot.values.get("messages") if snapshot.values else None
+            if saved and not snapshot.next:
+                # ponytail: graph finished before the rows were persisted — nothing to redo
+                emit({"type": "done", "usage": usage, "prompt": prompt})
+                return saved, usage
+            if saved:
+                emit({"type": "status", "message": "Resuming from checkpoint..."})
+                graph_input = None
+                final_messages = saved
+
+        async for event in agent.astream_events(graph_input, version="v2", config=config):
+            kind = event.get("event")
+
+            if kind == "on_chat_model_stream":
+                chunk = event.get("data", {}).get("chunk")
+                text = _extract_text(getattr(chunk, "content", ""))
+                if text:
+                    streamed_text += text
+                    emit({"type": "text", "delta": text})
+
+            elif kind == "on_tool_start":
+                run_id = event.get("run_id", "")
+                name = event.get("name", "unknown")
+                inp = event.get("data", {}).get("input", {})
+                pending[run_id] = {"name": name, "input": inp, "started": time.monotonic()}
+                emit({"type": "tool_start", "id": run_id, "name": name, "input": inp})
+
+            elif kind == "on_tool_end":
+                run_id = event.get("run_id", "")
+                raw = event.get("data", {}).get("output", "")
+                output = _tool_output(raw)
+
+                is_error = False
+                preview_url = None
+                changed_paths: list[str] = []
+                try:
+                    parsed = json.loads(output)
+                    is_error = parsed.get("isError", False)
+                    preview_url = parsed.get("previewUrl")
+                    changed_paths = parsed.get("changedPaths", [])
+                except json.JSONDecodeError:
+                    pass
+
+                meta = pending.pop(run_id, {})
+                if "started" in meta:
+                    TOOL_DURATION.labels(tool=meta["name"]).observe(time.monotonic() - meta["started"])
+                if not changed_paths and meta.get("name") in ("write_file", "edit_file"):
+                    path = meta.get("input", {}).get("path")
+                    if path:
+                        changed_paths = [path]
+
+                emit({
+                    "type": "tool_end",
+                    "id": run_id,
+                    "output": _summarize_tool_output(output, meta.get("name", "")),
+                    "isError": is_error,
+                })
+                if changed_paths:
+                    emit({"type": "files_changed", "paths": [normalize_path(p) for p in changed_paths]})
+                if preview_url:
+                    emit({"type": "preview", "url": preview_url})
+
+            elif kind == "on_chat_model_end":
+                output = event.get("data", {}).get("output")
+                if output:
+                    turn = extract_turn_usage(output)
+                    record_llm_usage(turn)
+                    usage = merge_usage(usage, turn)
+
+            elif kind == "on_chain_end" and event.get("name") == "LangGraph":
+                out = event.get("data", {}).get("output", {})
+                if out and "messages" in out:
+                    final_messages = out["messages"]
+                    tail = _last_ai_text(final_messages)
+                    if tail and tail not in streamed_text:
+                        emit({"type": "text", "delta": tail})
+
+    emit({"type": "done", "usage": usage, "prompt": prompt})
     return final_messages, usage
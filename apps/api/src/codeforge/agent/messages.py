@@ -60,7 +60,7 @@ def _summarize_tool_output(output: Any, name: str = "") -> str:
             pass
     else:
         text = str(text)
-    cap = 500 if name in ("read_file", "run_command", "check_project", "get_dev_server_logs") else 200
+    cap = 500 if name in ("read_file", "batch_files", "run_command", "check_project", "get_dev_server_logs") else 200
     return text if len(text) <= cap else text[:cap] + "…"
 
 
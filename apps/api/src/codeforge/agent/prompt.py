@@ -20,6 +20,7 @@ The project may already exist in the sandbox. Explore first with list_files and
 - NEVER use run_command to write or patch files (no cat, echo, tee, sed, heredocs).
 - File paths are relative to /home/user — e.g. netflix-clone/src/app/page.tsx. NEVER use /home/user/... or absolute paths.
 - read_file before edit_file when unsure of current content.
+- When creating or changing several files, group them into one batch_files call instead of many write_file/edit_file calls.
 - edit_file old_str must match exactly once.
 - Do NOT report done until check_project passes and the dev server is running without errors.
 - Prefer small focused changes over large rewrites.
@@ -3,6 +3,7 @@ import json
 
 from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
 
+from codeforge.agent.compaction import compact_history
 from codeforge.agent.messages import history_to_messages, messages_to_rows, rows_to_ui_messages
 
 rows = messages_to_rows([HumanMessage("hi"), AIMessage("hello")])
@@ -39,4 +40,21 @@ assert len(ui) == 2
 assert ui[1]["blocks"][0]["type"] == "tool"
 assert ui[1]["blocks"][0]["step"]["output"] == "src/app/page.tsx"
 assert ui[1]["blocks"][1]["type"] == "text"
+
+turns = []
+for n in range(6):
+    turns += [
+        HumanMessage(f"step {n}"),
+        AIMessage("", tool_calls=[{"id": f"r{n}", "name": "read_file", "args": {"path": "a.ts"}}]),
+        ToolMessage(json.dumps({"output": "x" * 4000, "isError": False}), tool_call_id=f"r{n}"),
+    ]
+kept, stats = compact_history(turns, budget_tokens=10**6, keep_turns=2, step_turns=2)
+assert kept is turns and stats["before"] == stats["after"]
+folded, stats = compact_history(turns, budget_tokens=3000, keep_turns=2, step_turns=2)
+assert len(folded) == len(turns) and stats["after"] < stats["before"]
+assert folded[-1].content == turns[-1].content
+again, _ = compact_history(turns, budget_tokens=3000, keep_turns=2, step_turns=2)
+assert [m.content for m in again] == [m.content for m in folded]
+everything, stats = compact_history(turns, budget_tokens=1, keep_turns=0, step_turns=2)
+assert len(everything) == len(turns) and stats["after"] < stats["before"]
 print("agent self-check passed")
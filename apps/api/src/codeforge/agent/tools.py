@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import json
-from typing import Any, List, Optional
+from typing import List, Literal, Optional
 
 from langchain_core.tools import StructuredTool
 from pydantic import BaseModel, Field
@@ -26,6 +26,20 @@ class ReadFileArgs(BaseModel):
     end_line: Optional[int] = None
 
 
+class FileOp(BaseModel):
+    op: Literal["read", "write", "edit"]
+    path: str
+    content: Optional[str] = Field(default=None, description="write: full file content")
+    old_str: Optional[str] = Field(default=None, description="edit: exact text to replace (must be unique)")
+    new_str: Optional[str] = Field(default=None, description="edit: replacement text")
+    start_line: Optional[int] = None
+    end_line: Optional[int] = None
+
+
+class BatchFilesArgs(BaseModel):
+    ops: List[FileOp] = Field(description="Applied in order; later ops see earlier writes/edits")
+
+
 class ListFilesArgs(BaseModel):
     path: str = "."
 
@@ -62,6 +76,11 @@ def build_tools(sandbox: E2BSandbox) -> List[StructuredTool]:
     async def read_file(path: str, start_line: Optional[int] = None, end_line: Optional[int] = None) -> str:
         return _dump(await sandbox.read_file(path, start_line, end_line))
 
+    async def batch_files(ops: List[FileOp]) -> str:
+        return _dump(await sandbox.apply_file_ops([
+            op.model_dump() if isinstance(op, FileOp) else dict(op) for op in ops
+        ]))
+
     async def list_files(path: str = ".") -> str:
         return _dump(await sandbox.list_files(path))
 
@@ -118,4 +137,10 @@ def build_tools(sandbox: E2BSandbox) -> List[StructuredTool]:
             description="Run tsc --noEmit and eslint. Use before declaring done.",
             args_schema=EmptyArgs,
         ),
+        # ponytail: appended last — earlier tool definitions stay byte-stable for the prefix cache
+        StructuredTool.from_function(
+            coroutine=batch_files, name="batch_files",
+            description="Many read/write/edit file ops in one call. Prefer over repeated write_file/edit_file/read_file when touching several files. Returns per-op results.",
+            args_schema=BatchFilesArgs,
+        ),
     ]
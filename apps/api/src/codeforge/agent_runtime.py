@@ -2,20 +2,32 @@ from __future__ import annotations
 
 import asyncio
 import json
-from typing import Any, AsyncIterator, Dict, Optional
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
 
 from fastapi import HTTPException
 from fastapi.responses import StreamingResponse
 
 from codeforge import db
-from codeforge.agent.graph import run_agent
+from codeforge.agent.graph import discard_checkpoint, run_agent
 from codeforge.agent.messages import history_to_messages, messages_to_rows
 from codeforge.config import settings
 from codeforge.db import SessionLocal
-from codeforge.sandbox import E2BSandbox
-
+from codeforge.events import RunEventLog, TextCoalescer, event_logs
+from codeforge.metrics import SSE_QUEUE_DEPTH, SSE_SUBSCRIBERS
+from codeforge.run_scheduler import run_scheduler
+from codeforge.sandbox_lifecycle import sandbox_lifecycle
+from codeforge.sandbox_pool import sandbox_pool
+from codeforge.shared_state import WORKER_ID, Lease, acquire, shared_state
+from codeforge.transcript import add_run_rows, add_user_message, ensure_ui_turns
+
+# ponytail: tasks of runs owned by this worker; ownership itself is the run:<id> lease
 active_tasks: Dict[str, asyncio.Task] = {}
 KEEPALIVE_S = 15
+RUN_LEASE_TTL_S = 30
+ABORT_POLL_S = 1.0
+
+SSE_SUBSCRIBERS.set_function(lambda: sum(log.subscriber_count() for log in event_logs.logs()))
+SSE_QUEUE_DEPTH.set_function(lambda: sum(log.queue_depth() for log in event_logs.logs()))
 
 
 def message_content(content: Any) -> str:
@@ -28,15 +40,34 @@ def needs_run(messages: list) -> bool:
     return bool(messages) and messages[-1].role == "user"
 
 
-def is_agent_running(session_id: str) -> bool:
+async def is_agent_running(session_id: str) -> bool:
     task = active_tasks.get(session_id)
-    return task is not None and not task.done()
+    if task is not None and not task.done():
+        return True
+    return await shared_state.get(f"run:{session_id}") is not None
 
 
-def abort_run(session_id: str) -> None:
+async def abort_run(session_id: str) -> None:
     task = active_tasks.pop(session_id, None)
     if task and not task.done():
         task.cancel()
+        return
+    # ponytail: owned by another worker — signal its lease; its watcher cancels the run
+    owner = await shared_state.get(f"run:{session_id}")
+    if owner:
+        await shared_state.put(f"abort:{owner}", WORKER_ID, ttl_s=RUN_LEASE_TTL_S)
+
+
+async def _watch_abort(lease: Lease, task: asyncio.Task) -> None:
+    while not task.done():
+        await asyncio.sleep(ABORT_POLL_S)
+        try:
+            aborted = await shared_state.get(f"abort:{lease.token}")
+        except Exception:
+            continue
+        if aborted:
+            task.cancel()
+            return
 
 
 async def _sse_response(
@@ -44,73 +75,90 @@ async def _sse_response(
     user_content: str,
     history: list[dict[str, Any]],
     sandbox_id: Optional[str],
+    user: str,
     *,
     save_user_message: bool,
+    user_message_id: Optional[str] = None,
+    stale_thread_id: Optional[str] = None,
 ) -> StreamingResponse:
-    if is_agent_running(session_id):
+    lease = await acquire(f"run:{session_id}", RUN_LEASE_TTL_S)
+    if lease is None:
         raise HTTPException(409, "Agent already running for this session")
 
-    queue: asyncio.Queue[Optional[dict]] = asyncio.Queue()
-    loop = asyncio.get_running_loop()
-
-    def emit(event: dict) -> None:
-        loop.call_soon_threadsafe(queue.put_nowait, event)
+    log = event_logs.start(session_id)
+    # ponytail: run_agent emits on the loop — no thread hop; text is merged per window
+    stream = TextCoalescer(log.publish)
+    emit = stream.push
 
     async def agent_task() -> None:
+        nonlocal user_message_id
+        watcher = asyncio.create_task(_watch_abort(lease, asyncio.current_task()))
         try:
+            if stale_thread_id:
+                # ponytail: superseded user turn — its partial run will never resume
+                await discard_checkpoint(stale_thread_id)
             if save_user_message:
-                async with SessionLocal() as s:
-                    await db.add_message(s, session_id, "user", user_content)
+                user_message_id = (await add_user_message(session_id, user_content)).id
+            thread_id = f"{session_id}:{user_message_id}"
 
-            emit({"type": "status", "message": "Connecting sandbox..."})
+            # ponytail: a queued run already holds the session lease, so abort works while waiting
+            async with run_scheduler.slot(user, lambda n: emit({"type": "queued", "position": n})):
+                emit({"type": "status", "message": "Connecting sandbox..."})
 
-            async with SessionLocal() as db_session:
-                async def on_created(sid: str) -> None:
-                    await db.update_sandbox_id(db_session, session_id, sid)
+                async with SessionLocal() as db_session:
+                    async def on_created(sid: str) -> None:
+                        await db.update_sandbox_id(db_session, session_id, sid)
 
-                sbx, _ = await E2BSandbox.connect_or_create(
-                    sandbox_id, settings.e2b_template, on_created,
-                )
+                    sbx, sid = await sandbox_pool.connect_or_create(
+                        sandbox_id, settings.e2b_template, on_created,
+                    )
 
-            emit({"type": "status", "message": "Agent is thinking..."})
+                emit({"type": "status", "message": "Agent is thinking..."})
 
-            final_messages, _ = await run_agent(sbx, history, user_content, emit)
+                with sandbox_pool.pinned(sid):
+                    async with sandbox_lifecycle.hold(session_id):
+                        final_messages, _ = await run_agent(
+                            sbx, history, user_content, emit, thread_id=thread_id,
+                        )
 
-            prior = len(history_to_messages(history)) + 1
-            for row in messages_to_rows(final_messages[prior:]):
-                async with SessionLocal() as s:
-                    await db.add_message(s, session_id, row["role"], row["content"])
+                prior = len(history_to_messages(history)) + 1
+                await add_run_rows(session_id, messages_to_rows(final_messages[prior:]))
+                await discard_checkpoint(thread_id)
 
         except asyncio.CancelledError:
             emit({"type": "error", "message": "Agent aborted"})
         except Exception as e:
             emit({"type": "error", "message": str(e)})
         finally:
-            loop.call_soon_threadsafe(queue.put_nowait, None)
+            watcher.cancel()
+            stream.flush()
+            log.close()
             active_tasks.pop(session_id, None)
+            await lease.release()
 
     task = asyncio.create_task(agent_task())
     active_tasks[session_id] = task
 
-    async def event_stream() -> AsyncIterator[bytes]:
-        try:
-            while True:
-                try:
-                    event = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_S)
-                except asyncio.TimeoutError:
-                    if task.done():
-                        break
-                    yield b": keepalive\n\n"
-                    continue
-                if event is None:
-                    break
-                yield f"data: {json.dumps(event)}\n\n".encode()
-        except asyncio.CancelledError:
-            # ponytail: browser disconnected — agent keeps running in background
-            pass
+    return sse_response(log)
 
+
+async def _event_stream(entries: AsyncIterator[Optional[Tuple[int, dict]]]) -> AsyncIterator[bytes]:
+    try:
+        async for entry in entries:
+            if entry is None:
+                yield b": keepalive\n\n"
+                continue
+            event_id, event = entry
+            yield f"id: {event_id}\ndata: {json.dumps(event)}\n\n".encode()
+    except asyncio.CancelledError:
+        # ponytail: browser disconnected — agent keeps running in background
+        pass
+
+
+def stream_sse(entries: AsyncIterator[Optional[Tuple[int, dict]]]) -> StreamingResponse:
+    """SSE response from (id, event) entries; None entries become keepalive comments."""
     return StreamingResponse(
-        event_stream(),
+        _event_stream(entries),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -120,11 +168,26 @@ async def _sse_response(
     )
 
 
-async def start_run(session_id: str) -> StreamingResponse:
+def sse_response(log: RunEventLog, last_event_id: int = 0) -> StreamingResponse:
+    return stream_sse(log.subscribe(last_event_id, keepalive_s=KEEPALIVE_S))
+
+
+def attach_events(session_id: str, last_event_id: int = 0) -> StreamingResponse:
+    """Re-attach to the session's latest run, replaying events after last_event_id."""
+    log = event_logs.get(session_id)
+    if log is None:
+        raise HTTPException(404, "No run events for this session")
+    entries = log.subscribe(last_event_id, keepalive_s=KEEPALIVE_S)
+    return stream_sse(sandbox_lifecycle.held(session_id, entries))
+
+
+async def start_run(session_id: str, user: str) -> StreamingResponse:
     async with SessionLocal() as session:
         row = await db.get_session(session, session_id)
         if not row:
             raise HTTPException(404, "Session not found")
+        # ponytail: materialize legacy turns before this run appends new ones
+        await ensure_ui_turns(session, session_id)
         msgs = await db.list_messages(session, session_id)
 
     if not msgs:
@@ -136,18 +199,23 @@ async def start_run(session_id: str) -> StreamingResponse:
     history = [{"role": m.role, "content": m.content} for m in msgs[:-1]]
 
     return await _sse_response(
-        session_id, user_content, history, row.sandbox_id, save_user_message=False,
+        session_id, user_content, history, row.sandbox_id, user,
+        save_user_message=False, user_message_id=msgs[-1].id,
     )
 
 
-async def start_message(session_id: str, content: str) -> StreamingResponse:
+async def start_message(session_id: str, content: str, user: str) -> StreamingResponse:
     async with SessionLocal() as session:
         row = await db.get_session(session, session_id)
         if not row:
             raise HTTPException(404, "Session not found")
+        # ponytail: materialize legacy turns before this run appends new ones
+        await ensure_ui_turns(session, session_id)
         msgs = await db.list_messages(session, session_id)
 
     history = [{"role": m.role, "content": m.content} for m in msgs]
+    stale = f"{session_id}:{msgs[-1].id}" if msgs and msgs[-1].role == "user" else None
     return await _sse_response(
-        session_id, content, history, row.sandbox_id, save_user_message=True,
+        session_id, content, history, row.sandbox_id, user,
+        save_user_message=True, stale_thread_id=stale,
     )
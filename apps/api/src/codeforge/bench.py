@@ -0,0 +1,167 @@
+"""ponytail: micro-benchmarks for the pure-Python hot paths.
+
+    python -m codeforge.bench            # compare against the stored baseline
+    python -m codeforge.bench --update   # (re)write the baseline
+
+The first run on a machine has nothing to compare against and writes the
+baseline. Later runs exit non-zero when ops/sec drops, or peak memory grows,
+by more than --threshold.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from codeforge.agent.graph import _summarize_tool_output
+from codeforge.agent.messages import history_to_messages, messages_to_rows, rows_to_ui_messages
+from codeforge.config import REPO_ROOT
+from codeforge.sandbox import _resolve_cd, format_command_output, normalize_path, truncate
+
+BASELINE_PATH = REPO_ROOT / "data" / "bench-baseline.json"
+SIZES = (10, 100, 1_000, 10_000, 50_000)
+THRESHOLD = 0.25
+MIN_TIME_S = 0.2
+REPEATS = 3
+MEMORY_SLACK_BYTES = 64 * 1024
+
+_FILE = "\n".join(f"export const line{i} = {i};  // {'x' * 40}" for i in range(80))
+
+
+def synthetic_rows(n: int) -> list[dict[str, Any]]:
+    """n stored rows cycling user → tool_calls → tool results → answer."""
+    rows: list[dict[str, Any]] = []
+    start = datetime(2024, 1, 1)
+    turn = 0
+    while len(rows) < n:
+        calls = [
+            {"id": f"t{turn}a", "name": "read_file", "args": {"path": f"src/app/page{turn}.tsx"}},
+            {"id": f"t{turn}b", "name": "run_command", "args": {"command": "npm run build"}},
+        ]
+        rows.append({"role": "user", "content": f"step {turn}: update the page"})
+        rows.append({
+            "role": "assistant",
+            "content": {"_internal": "tool_calls", "text": "Reading first.", "tool_calls": calls},
+        })
+        rows.append({
+            "role": "tool",
+            "content": {"tool_call_id": calls[0]["id"], "output": json.dumps({"output": _FILE, "isError": False})},
+        })
+        rows.append({
+            "role": "tool",
+            "content": {"tool_call_id": calls[1]["id"], "output": json.dumps({"output": "exit_code: 0", "isError": False})},
+        })
+        rows.append({"role": "assistant", "content": f"Updated page {turn}."})
+        turn += 1
+    rows = rows[:n]
+    for i, row in enumerate(rows):
+        row["id"] = f"m{i}"
+        row["created_at"] = start + timedelta(microseconds=i)
+    return rows
+
+
+def _ops_per_sec(fn: Callable[[], Any]) -> float:
+    best = 0.0
+    for _ in range(REPEATS):
+        n = 1
+        while True:
+            started = time.perf_counter()
+            for _ in range(n):
+                fn()
+            elapsed = time.perf_counter() - started
+            if elapsed >= MIN_TIME_S:
+                break
+            n *= 2
+        best = max(best, n / elapsed)
+    return best
+
+
+def _peak_bytes(fn: Callable[[], Any]) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def cases(sizes: tuple[int, ...]) -> dict[str, Callable[[], Any]]:
+    out: dict[str, Callable[[], Any]] = {}
+    for size in sizes:
+        rows = synthetic_rows(size)
+        history = [{"role": r["role"], "content": r["content"]} for r in rows]
+        messages = history_to_messages(history)
+        out[f"rows_to_ui_messages[{size}]"] = lambda rows=rows: rows_to_ui_messages(rows)
+        out[f"history_to_messages[{size}]"] = lambda history=history: history_to_messages(history)
+        out[f"messages_to_rows[{size}]"] = lambda messages=messages: messages_to_rows(messages)
+
+    big = "x" * 100_000
+    stdout = "\n".join(f"compiled module {i}" for i in range(2_000))
+    tool_json = json.dumps({"output": _FILE * 4, "isError": False})
+    out["truncate[100KB]"] = lambda: truncate(big)
+    out["format_command_output[40KB]"] = lambda: format_command_output(stdout, "warn", 1)
+    out["normalize_path"] = lambda: normalize_path("/home/user/app/src/components/ui/button.tsx")
+    out["_resolve_cd"] = lambda: _resolve_cd("/home/user/app/src", "../../app/./components/../lib")
+    out["_summarize_tool_output[json]"] = lambda: _summarize_tool_output(tool_json, "read_file")
+    out["_summarize_tool_output[text]"] = lambda: _summarize_tool_output(stdout, "run_command")
+    return out
+
+
+def run(sizes: tuple[int, ...]) -> dict[str, dict[str, float]]:
+    results: dict[str, dict[str, float]] = {}
+    for name, fn in cases(sizes).items():
+        results[name] = {"ops_per_sec": _ops_per_sec(fn), "peak_bytes": _peak_bytes(fn)}
+        r = results[name]
+        print(f"{name:<36} {r['ops_per_sec']:>14,.1f} ops/s {r['peak_bytes'] / 1024:>12,.1f} KiB peak")
+    return results
+
+
+def regressions(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    threshold: float,
+) -> list[str]:
+    failures: list[str] = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if r["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold):
+            failures.append(f"{name}: {r['ops_per_sec']:,.1f} ops/s vs baseline {base['ops_per_sec']:,.1f}")
+        limit = max(base["peak_bytes"] * (1 + threshold), base["peak_bytes"] + MEMORY_SLACK_BYTES)
+        if r["peak_bytes"] > limit:
+            failures.append(f"{name}: {r['peak_bytes']:,} B peak vs baseline {base['peak_bytes']:,}")
+    return failures
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--update", action="store_true", help="write results as the new baseline")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="allowed fractional regression")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="comma-separated transcript sizes")
+    args = parser.parse_args(argv)
+
+    results = run(tuple(int(s) for s in args.sizes.split(",") if s))
+    if args.update or not args.baseline.exists():
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(results, indent=2, sort_keys=True))
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    failures = regressions(results, json.loads(args.baseline.read_text()), args.threshold)
+    for f in failures:
+        print(f"REGRESSION {f}", file=sys.stderr)
+    if failures:
+        return 1
+    print("bench passed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Response compression (brotli when installed, else gzip) as ASGI middleware.
+
+Only text-like types (text/*, JSON, JavaScript, SVG) are compressed, and
+only bodies of at least MIN_SIZE — streamed bodies are judged by
+Content-Length, else buffered up to MIN_SIZE before deciding. Skips SSE
+streams, partial/empty responses and already-encoded bodies.
+Compressed responses get an encoding-suffixed ETag (`"abc-gzip"`), and the
+suffix is stripped from incoming If-None-Match so handlers compare raw tags.
+"""
+from __future__ import annotations
+
+import re
+import zlib
+from typing import Any, Callable, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # ponytail: optional — gzip only without the brotli wheel
+    brotli = None
+
+MIN_SIZE = 1024
+SKIP_STATUS = {204, 206, 304, 416}
+_SUFFIX_RE = re.compile(r'-(?:br|gzip)"')
+# ponytail: images, fonts, wasm and archives are already compressed
+_COMPRESSIBLE = {"application/json", "application/javascript", "application/x-javascript", "image/svg+xml"}
+
+
+def _compressible(content_type: str) -> bool:
+    media = content_type.split(";")[0].strip().lower()
+    return media.startswith("text/") or media.endswith("+json") or media in _COMPRESSIBLE
+
+
+def _too_small(headers: Headers, minimum_size: int) -> bool:
+    length = headers.get("content-length", "")
+    return length.isdigit() and int(length) < minimum_size
+
+
+def _choose(accept: str) -> Optional[str]:
+    offered = {part.split(";")[0].strip().lower() for part in accept.split(",")}
+    if brotli is not None and "br" in offered:
+        return "br"
+    if "gzip" in offered:
+        return "gzip"
+    return None
+
+
+def _compressor(encoding: str) -> tuple[Callable[[bytes], bytes], Callable[[], bytes], Callable[[], bytes]]:
+    """(compress chunk, sync-flush, finish) for the chosen encoding."""
+    if encoding == "br":
+        c: Any = brotli.Compressor(quality=4)
+        return c.process, c.flush, c.finish
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return z.compress, lambda: z.flush(zlib.Z_SYNC_FLUSH), z.flush
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if "if-none-match" in headers:
+            raw = MutableHeaders(scope=scope)
+            raw["if-none-match"] = _SUFFIX_RE.sub('"', headers["if-none-match"])
+        encoding = _choose(headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _Responder(send, encoding, self.minimum_size))
+
+
+class _Responder:
+    def __init__(self, send: Send, encoding: str, minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start: Optional[Message] = None
+        self.passthrough = False
+        self.held = b""
+
+    async def __call__(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            self.passthrough = (
+                message["status"] in SKIP_STATUS
+                or "content-encoding" in headers
+                or content_type.startswith("text/event-stream")
+                or not _compressible(content_type)
+                or _too_small(headers, self.minimum_size)
+            )
+            if self.passthrough:
+                await self.send(message)
+            else:
+                self.start = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body, more = message.get("body", b""), message.get("more_body", False)
+        if self.start is not None:
+            # ponytail: no Content-Length — hold chunks until the body proves big enough
+            body, self.held = self.held + body, b""
+            if more and len(body) < self.minimum_size:
+                self.held = body
+                return
+            start, self.start = self.start, None
+            if len(body) < self.minimum_size:
+                self.passthrough = True
+                await self.send(start)
+                await self.send({"type": "http.response.body", "body": body, "more_body": False})
+                return
+            self.compress, self.flush, self.finish = _compressor(self.encoding)
+            headers = MutableHeaders(raw=start["headers"])
+            del headers["content-length"]
+            headers["content-encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if "etag" in headers and headers["etag"].endswith('"'):
+                headers["etag"] = f'{headers["etag"][:-1]}-{self.encoding}"'
+            await self.send(start)
+
+        # ponytail: sync-flush each streamed chunk so file streams never stall
+        out = self.compress(body) + (self.flush() if more else self.finish())
+        await self.send({"type": "http.response.body", "body": out, "more_body": more})
@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Literal
 
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -11,6 +12,14 @@ def _default_database_url() -> str:
     return f"sqlite+aiosqlite:///{REPO_ROOT / 'data' / 'codeforge.db'}"
 
 
+def _default_checkpoint_path() -> str:
+    return str(REPO_ROOT / "data" / "checkpoints.db")
+
+
+def _default_shared_state_path() -> str:
+    return str(REPO_ROOT / "data" / "shared-state.db")
+
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(
         env_file=REPO_ROOT / ".env",
@@ -18,12 +27,41 @@ class Settings(BaseSettings):
         extra="ignore",
     )
 
-    deepseek_api_key: str
-    e2b_api_key: str
+    # ponytail: optional at import so offline tools (bench) load; the API refuses to start without it
+    deepseek_api_key: str = ""
+    e2b_api_key: str = ""
     e2b_template: str = "code-interpreter-v1"
     database_url: str = Field(default_factory=_default_database_url)
+    sqlite_busy_timeout_ms: int = 5000
+    checkpoint_path: str = Field(default_factory=_default_checkpoint_path)
+    # ponytail: every worker on the host opens the same file — keep it on a local disk (WAL)
+    shared_state_path: str = Field(default_factory=_default_shared_state_path)
+    history_token_budget: int = 48_000
+    compaction_keep_turns: int = Field(default=4, ge=0)
+    compaction_step_turns: int = Field(default=4, ge=1)
     cors_origin: str = "http://localhost:3000"
     model: str = "deepseek-chat"
+    # ponytail: enforced per worker process, not globally — runs beyond these wait in a fair queue
+    worker_max_runs: int = 8
+    worker_max_runs_per_user: int = 2
+    # ponytail: comma-separated peer IPs whose X-User-Id header is trusted; empty → never
+    trusted_proxies: str = ""
+    sandbox_backend: Literal["e2b", "local"] = "e2b"
+    # ponytail: empty → <tmp>/codeforge-sandboxes; only used by the local backend
+    local_sandbox_root: str = ""
+    sandbox_pool_size: int = 64
+    sandbox_pool_ttl_s: int = 15 * 60
+    sandbox_liveness_s: int = 30
+    file_mirror_max_bytes: int = 64 * 1024 * 1024
+    sandbox_pause_after_s: int = 10 * 60
+    sandbox_sweep_s: int = 60
+    # ponytail: untracked sandboxes younger than this may still be mid-create
+    sandbox_orphan_grace_s: int = 15 * 60
+    # ponytail: 0 disables; keep max age well under the 30 min sandbox timeout
+    warm_pool_size: int = 0
+    warm_pool_max_age_s: int = 20 * 60
+    # ponytail: optional shell command run in each warm sandbox before it is offered
+    warm_pool_provision: str = ""
 
 
 settings = Settings()
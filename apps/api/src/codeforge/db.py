@@ -1,10 +1,11 @@
 from __future__ import annotations
 
 import uuid
-from datetime import datetime, timezone
-from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 
-from sqlalchemy import JSON, DateTime, ForeignKey, String, select
+from sqlalchemy import JSON, DateTime, ForeignKey, Index, Integer, String, event, func, select, text, update
+from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
@@ -17,11 +18,14 @@ class Base(DeclarativeBase):
 
 class SessionRow(Base):
     __tablename__ = "sessions"
+    __table_args__ = (Index("ix_sessions_created", "created_at"),)
 
     id: Mapped[str] = mapped_column(String, primary_key=True)
     title: Mapped[str] = mapped_column(String, nullable=False)
     sandbox_id: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     sandbox_state: Mapped[str] = mapped_column(String, default="running")
+    # ponytail: detected app root inside the sandbox; None until found
+    project_dir: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
     )
@@ -32,9 +36,15 @@ class SessionRow(Base):
 
 class MessageRow(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_session_created", "session_id", "created_at"),
+        Index("ix_messages_session_seq", "session_id", "seq", unique=True),
+    )
 
     id: Mapped[str] = mapped_column(String, primary_key=True)
     session_id: Mapped[str] = mapped_column(String, ForeignKey("sessions.id", ondelete="CASCADE"))
+    # ponytail: per-session order — created_at can tie within one run
+    seq: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     role: Mapped[str] = mapped_column(String, nullable=False)
     content: Mapped[object] = mapped_column(JSON, nullable=False)
     created_at: Mapped[datetime] = mapped_column(
@@ -43,13 +53,97 @@ class MessageRow(Base):
     session: Mapped["SessionRow"] = relationship(back_populates="messages")
 
 
+class UiTurnRow(Base):
+    """UI-ready transcript turn, materialized from raw rows at write time."""
+
+    __tablename__ = "ui_turns"
+    __table_args__ = (Index("ix_ui_turns_session_seq", "session_id", "seq"),)
+
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    session_id: Mapped[str] = mapped_column(String, ForeignKey("sessions.id", ondelete="CASCADE"))
+    # seq of the turn's first message row
+    seq: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    role: Mapped[str] = mapped_column(String, nullable=False)
+    content: Mapped[str] = mapped_column(String, default="")
+    blocks: Mapped[Optional[list]] = mapped_column(JSON, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+
 engine = create_async_engine(settings.database_url, echo=False)
 SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
+if engine.url.get_backend_name() == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record) -> None:
+        # ponytail: WAL lets readers proceed while the write queue commits
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute(f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}")
+        cur.close()
+
+
+# Schema migrations — PRAGMA user_version holds the applied version.
+# Fresh databases get create_all and are stamped with the latest version.
+
+def _columns(conn: Connection, table: str) -> List[str]:
+    return [r[1] for r in conn.execute(text(f"PRAGMA table_info({table})"))]
+
+
+def _migrate_1_indexes(conn: Connection) -> None:
+    Base.metadata.create_all(conn, tables=[UiTurnRow.__table__])
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_messages_session_created ON messages (session_id, created_at)"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_sessions_created ON sessions (created_at)"))
+
+
+def _migrate_2_seq(conn: Connection) -> None:
+    for table in ("messages", "ui_turns"):
+        if "seq" not in _columns(conn, table):
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN seq INTEGER"))
+    conn.execute(text(
+        "CREATE TEMP TABLE _seq AS SELECT id, ROW_NUMBER() OVER "
+        "(PARTITION BY session_id ORDER BY created_at, rowid) AS seq FROM messages"
+    ))
+    conn.execute(text("UPDATE messages SET seq = (SELECT seq FROM _seq WHERE _seq.id = messages.id)"))
+    conn.execute(text("DROP TABLE _seq"))
+    conn.execute(text("UPDATE ui_turns SET seq = (SELECT seq FROM messages WHERE messages.id = ui_turns.id)"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_ui_turns_session_created"))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_messages_session_seq ON messages (session_id, seq)"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_ui_turns_session_seq ON ui_turns (session_id, seq)"))
+
+
+def _migrate_3_project_dir(conn: Connection) -> None:
+    if "project_dir" not in _columns(conn, "sessions"):
+        conn.execute(text("ALTER TABLE sessions ADD COLUMN project_dir VARCHAR"))
+
+
+MIGRATIONS: List[Tuple[int, Callable[[Connection], None]]] = [
+    (1, _migrate_1_indexes),
+    (2, _migrate_2_seq),
+    (3, _migrate_3_project_dir),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def _migrate(conn: Connection) -> None:
+    version = conn.execute(text("PRAGMA user_version")).scalar_one()
+    if not conn.dialect.has_table(conn, SessionRow.__tablename__):
+        Base.metadata.create_all(conn)
+        version = SCHEMA_VERSION
+    for target, step in MIGRATIONS:
+        if target > version:
+            step(conn)
+            version = target
+    conn.execute(text(f"PRAGMA user_version = {version}"))
+
 
 async def init_db() -> None:
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_migrate)
 
 
 async def create_session(db: AsyncSession, title: str) -> SessionRow:
@@ -70,9 +164,44 @@ async def update_sandbox_id(db: AsyncSession, session_id: str, sandbox_id: str)
     if row:
         row.sandbox_id = sandbox_id
         row.sandbox_state = "running"
+        row.project_dir = None
         await db.commit()
 
 
+async def set_sandbox_state(db: AsyncSession, sandbox_id: str, state: str) -> bool:
+    """Set the state of whichever session owns sandbox_id; True if it changed."""
+    result = await db.execute(
+        update(SessionRow)
+        .where(SessionRow.sandbox_id == sandbox_id, SessionRow.sandbox_state != state)
+        .values(sandbox_state=state)
+    )
+    await db.commit()
+    return result.rowcount > 0
+
+
+async def get_project_dir(db: AsyncSession, sandbox_id: str) -> Optional[str]:
+    result = await db.execute(
+        select(SessionRow.project_dir).where(SessionRow.sandbox_id == sandbox_id).limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+async def set_project_dir(db: AsyncSession, sandbox_id: str, project_dir: Optional[str]) -> None:
+    await db.execute(
+        update(SessionRow).where(SessionRow.sandbox_id == sandbox_id).values(project_dir=project_dir)
+    )
+    await db.commit()
+
+
+async def list_sandbox_sessions(db: AsyncSession) -> List[Tuple[str, str, str]]:
+    """(session id, sandbox id, sandbox state) for every session with a sandbox."""
+    result = await db.execute(
+        select(SessionRow.id, SessionRow.sandbox_id, SessionRow.sandbox_state)
+        .where(SessionRow.sandbox_id.is_not(None))
+    )
+    return [(r[0], r[1], r[2]) for r in result.all()]
+
+
 async def list_sessions(db: AsyncSession, *, limit: int = 50) -> List[SessionRow]:
     result = await db.execute(
         select(SessionRow).order_by(SessionRow.created_at.desc()).limit(limit)
@@ -84,14 +213,121 @@ async def list_messages(db: AsyncSession, session_id: str) -> List[MessageRow]:
     result = await db.execute(
         select(MessageRow)
         .where(MessageRow.session_id == session_id)
-        .order_by(MessageRow.created_at)
+        .order_by(MessageRow.seq)
+    )
+    return list(result.scalars().all())
+
+
+async def list_ui_turn_page(
+    db: AsyncSession,
+    session_id: str,
+    *,
+    limit: int,
+    before: Optional[int] = None,
+) -> Tuple[List[UiTurnRow], Optional[int]]:
+    """Newest `limit` UI turns with seq below `before`, oldest first.
+
+    Also returns the cursor for the next older page, or None at the start
+    of the session.
+    """
+    query = select(UiTurnRow).where(UiTurnRow.session_id == session_id)
+    if before is not None:
+        query = query.where(UiTurnRow.seq < before)
+    result = await db.execute(query.order_by(UiTurnRow.seq.desc()).limit(limit + 1))
+    turns = list(result.scalars().all())
+    cursor = turns[limit - 1].seq if len(turns) > limit else None
+    return list(reversed(turns[:limit])), cursor
+
+
+async def has_ui_turns(db: AsyncSession, session_id: str) -> bool:
+    result = await db.execute(
+        select(UiTurnRow.id).where(UiTurnRow.session_id == session_id).limit(1)
     )
+    return result.scalar_one_or_none() is not None
+
+
+def new_ui_turn_rows(session_id: str, turns: List[dict]) -> List[UiTurnRow]:
+    return [
+        UiTurnRow(
+            id=t["id"],
+            session_id=session_id,
+            role=t["role"],
+            content=t.get("content", ""),
+            blocks=t.get("blocks"),
+            created_at=t["created_at"],
+        )
+        for t in turns
+    ]
+
+
+async def add_ui_turns(db: AsyncSession, session_id: str, turns: List[dict]) -> None:
+    await add_all(db, new_ui_turn_rows(session_id, turns))
+
+
+async def list_session_ids(db: AsyncSession) -> List[str]:
+    result = await db.execute(select(SessionRow.id))
     return list(result.scalars().all())
 
 
+async def last_message(db: AsyncSession, session_id: str) -> Optional[MessageRow]:
+    result = await db.execute(
+        select(MessageRow)
+        .where(MessageRow.session_id == session_id)
+        .order_by(MessageRow.seq.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
 async def add_message(db: AsyncSession, session_id: str, role: str, content: object) -> MessageRow:
-    row = MessageRow(id=str(uuid.uuid4()), session_id=session_id, role=role, content=content)
-    db.add(row)
-    await db.commit()
-    await db.refresh(row)
+    row = new_message_rows(session_id, [{"role": role, "content": content}])[0]
+    await add_all(db, [row])
     return row
+
+
+def new_message_rows(session_id: str, rows: List[dict]) -> List[MessageRow]:
+    """Unsaved MessageRows with ids and strictly increasing timestamps."""
+    now = datetime.now(timezone.utc)
+    return [
+        MessageRow(
+            id=str(uuid.uuid4()),
+            session_id=session_id,
+            role=r["role"],
+            content=r["content"],
+            created_at=now + timedelta(microseconds=i),
+        )
+        for i, r in enumerate(rows)
+    ]
+
+
+async def _assign_seq(db: AsyncSession, rows: Sequence[Base]) -> None:
+    next_seq: Dict[str, int] = {}
+    for r in rows:
+        if isinstance(r, MessageRow) and r.seq is None:
+            if r.session_id not in next_seq:
+                result = await db.execute(
+                    select(func.coalesce(func.max(MessageRow.seq), 0))
+                    .where(MessageRow.session_id == r.session_id)
+                )
+                next_seq[r.session_id] = result.scalar_one() + 1
+            r.seq = next_seq[r.session_id]
+            next_seq[r.session_id] += 1
+
+    by_id = {r.id: r.seq for r in rows if isinstance(r, MessageRow)}
+    for r in rows:
+        if isinstance(r, UiTurnRow) and r.seq is None:
+            if r.id not in by_id:
+                result = await db.execute(select(MessageRow.seq).where(MessageRow.id == r.id))
+                by_id[r.id] = result.scalar_one_or_none()
+            r.seq = by_id[r.id]
+
+
+async def add_all(db: AsyncSession, rows: Sequence[Base]) -> None:
+    """Insert many rows in one transaction (no per-row refresh).
+
+    Message rows get the next per-session seq; UI turns inherit the seq of
+    their first message.
+    """
+    await _assign_seq(db, rows)
+    db.add_all(rows)
+    await db.commit()
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from itertools import islice
+from typing import AsyncIterator, Deque, Iterable, List, Optional, Set, Tuple
+
+DEV_LOG_MAX_LINES = 2000
+DEV_LOG_MAX_LINE_CHARS = 2000
+
+
+class DevLog:
+    """Fixed-capacity line ring for dev-server output.
+
+    Chunks arrive split anywhere; the unterminated tail is held in `partial`
+    until its newline shows up. Memory is bounded by max_lines × max_line_chars.
+    Complete lines are numbered (`total` is the number of the newest) so
+    followers keep a cursor into the ring instead of a private buffer.
+    """
+
+    def __init__(self, max_lines: int = DEV_LOG_MAX_LINES, max_line_chars: int = DEV_LOG_MAX_LINE_CHARS):
+        self.max_line_chars = max_line_chars
+        self.lines: Deque[str] = deque(maxlen=max_lines)
+        self.partial = ""
+        self.total = 0
+        self.resets = 0
+        self._waiters: Set[asyncio.Event] = set()
+
+    def __bool__(self) -> bool:
+        return bool(self.lines or self.partial)
+
+    def clear(self) -> None:
+        # ponytail: numbering continues across relaunches so Last-Event-IDs stay valid
+        self.lines.clear()
+        self.partial = ""
+        self.resets += 1
+        self._wake()
+
+    def append(self, data: str) -> None:
+        *complete, self.partial = (self.partial + data).split("\n")
+        # ponytail: a newline-free flood (progress bars) must not grow unbounded
+        if len(self.partial) > self.max_line_chars:
+            complete.append(self.partial)
+            self.partial = ""
+        for line in complete:
+            self.lines.append(line[: self.max_line_chars])
+        if complete:
+            self.total += len(complete)
+            self._wake()
+
+    def _wake(self) -> None:
+        for waiter in self._waiters:
+            waiter.set()
+
+    def since(self, cursor: int) -> Tuple[List[str], int]:
+        """Lines numbered after `cursor`, and how many of those already left the ring."""
+        first = self.total - len(self.lines)
+        dropped = max(first - cursor, 0)
+        fresh = self.total - cursor - dropped
+        return (list(islice(reversed(self.lines), fresh))[::-1] if fresh > 0 else []), dropped
+
+    async def follow(
+        self, after: int = 0, *, backlog: int = 200, keepalive_s: Optional[float] = None,
+    ) -> AsyncIterator[Optional[Tuple[int, dict]]]:
+        """Backlog snapshot then live lines as (last line number, event); None is a keepalive.
+
+        `after` resumes from a Last-Event-ID; 0 starts with the last `backlog` lines.
+        """
+        first = self.total - len(self.lines)
+        # ponytail: an id from before an API restart is ahead of us — start fresh
+        cursor = after if 0 < after <= self.total else max(self.total - backlog, first)
+        resets = self.resets
+        wake = asyncio.Event()
+        self._waiters.add(wake)
+        try:
+            while True:
+                wake.clear()
+                if self.resets != resets:
+                    resets = self.resets
+                    cursor = max(cursor, self.total - len(self.lines))
+                    yield cursor, {"type": "reset"}
+                lines, dropped = self.since(cursor)
+                if lines or dropped:
+                    cursor = self.total
+                    yield cursor, {"type": "lines", "lines": lines, "dropped": dropped}
+                try:
+                    await asyncio.wait_for(wake.wait(), timeout=keepalive_s)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self._waiters.discard(wake)
+
+    def tail(self, n: int) -> str:
+        """Last n lines (including the unterminated one); O(n), not O(log)."""
+        if n <= 0:
+            return ""
+        extra = [self.partial] if self.partial else []
+        take = n - len(extra)
+        lines = list(islice(reversed(self.lines), take))[::-1] if take > 0 else []
+        return "\n".join(lines + extra[-n:])
+
+
+class StreamMatcher:
+    """Finds needles in a chunked stream, scanning only new text.
+
+    Keeps the last (longest needle − 1) chars as overlap so a needle split
+    across chunks still matches; a needle wholly inside the overlap was
+    already reported and is not reported again.
+    """
+
+    def __init__(self, needles: Iterable[str]):
+        self.needles = tuple(n.lower() for n in needles)
+        self.overlap = max((len(n) for n in self.needles), default=1) - 1
+        self._carry = ""
+
+    def reset(self) -> None:
+        self._carry = ""
+
+    def feed(self, data: str) -> Optional[str]:
+        window = self._carry + data.lower()
+        carried = len(self._carry)
+        self._carry = window[-self.overlap:] if self.overlap else ""
+        for needle in self.needles:
+            if window.find(needle, max(carried - len(needle) + 1, 0)) != -1:
+                return needle
+        return None
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Deque, Dict, Optional, Set, Tuple
+
+from codeforge.metrics import SSE_TEXT_DROPPED
+
+EVENT_LOG_CAPACITY = 5000
+EVENT_LOG_TTL_S = 10 * 60
+SUBSCRIBER_BUFFER = 256
+COALESCE_WINDOW_S = 0.05
+COALESCE_MAX_CHARS = 2048
+
+Event = dict
+Entry = Tuple[int, Event]
+
+
+def _is_text(entry: Entry) -> bool:
+    return entry[1].get("type") == "text"
+
+
+class TextCoalescer:
+    """Merge consecutive text deltas over a short time/size window.
+
+    Non-text events flush pending text first, so ordering is preserved.
+    Must be called on the event loop.
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[Event], object],
+        *,
+        window_s: float = COALESCE_WINDOW_S,
+        max_chars: int = COALESCE_MAX_CHARS,
+    ):
+        self.publish = publish
+        self.window_s = window_s
+        self.max_chars = max_chars
+        self._pending: list[str] = []
+        self._size = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def push(self, event: Event) -> None:
+        if event.get("type") != "text":
+            self.flush()
+            self.publish(event)
+            return
+        delta = event.get("delta", "")
+        self._pending.append(delta)
+        self._size += len(delta)
+        if self._size >= self.max_chars:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window_s, self.flush)
+
+    def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending:
+            delta = "".join(self._pending)
+            self._pending.clear()
+            self._size = 0
+            self.publish({"type": "text", "delta": delta})
+
+
+class _Subscriber:
+    """Bounded per-client buffer: text coalesces into a pending text tail or
+    is dropped when full; tool and control events are never dropped."""
+
+    def __init__(self, limit: int = SUBSCRIBER_BUFFER):
+        self.limit = limit
+        self.buffer: Deque[Entry] = deque()
+        self.wakeup = asyncio.Event()
+        self.closed = False
+
+    def offer(self, entry: Entry) -> None:
+        if _is_text(entry) and self.buffer and _is_text(self.buffer[-1]):
+            _, tail = self.buffer.pop()
+            entry = (entry[0], {"type": "text", "delta": tail.get("delta", "") + entry[1].get("delta", "")})
+        elif _is_text(entry) and len(self.buffer) >= self.limit:
+            SSE_TEXT_DROPPED.inc()
+            return
+        self.buffer.append(entry)
+        self.wakeup.set()
+
+    def close(self) -> None:
+        self.closed = True
+        self.wakeup.set()
+
+
+class RunEventLog:
+    """Sequenced, bounded event buffer for one session's run.
+
+    Any number of SSE subscribers fan out from it; a reconnecting client
+    passes its Last-Event-ID and receives only the events it missed (as
+    long as they are still inside the ring).
+    """
+
+    def __init__(self, first_id: int = 1, capacity: int = EVENT_LOG_CAPACITY):
+        self.events: Deque[Entry] = deque(maxlen=capacity)
+        self.next_id = first_id
+        self.closed_at: Optional[float] = None
+        self._subscribers: Set[_Subscriber] = set()
+
+    @property
+    def closed(self) -> bool:
+        return self.closed_at is not None
+
+    def publish(self, event: Event) -> int:
+        entry = (self.next_id, event)
+        self.next_id += 1
+        self.events.append(entry)
+        for sub in self._subscribers:
+            sub.offer(entry)
+        return entry[0]
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed_at = time.monotonic()
+        for sub in self._subscribers:
+            sub.close()
+
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def queue_depth(self) -> int:
+        return sum(len(sub.buffer) for sub in self._subscribers)
+
+    async def subscribe(
+        self, last_event_id: int = 0, *, keepalive_s: Optional[float] = None,
+    ) -> AsyncIterator[Optional[Entry]]:
+        """Yield missed then live entries; None is a keepalive tick."""
+        sub = _Subscriber()
+        self._subscribers.add(sub)
+        try:
+            last = last_event_id
+            for entry in list(self.events):
+                if entry[0] > last:
+                    last = entry[0]
+                    yield entry
+            if self.closed:
+                return
+            while True:
+                while sub.buffer:
+                    entry = sub.buffer.popleft()
+                    if entry[0] > last:
+                        last = entry[0]
+                        yield entry
+                if sub.closed:
+                    return
+                sub.wakeup.clear()
+                try:
+                    await asyncio.wait_for(sub.wakeup.wait(), timeout=keepalive_s)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self._subscribers.discard(sub)
+
+
+class EventLogRegistry:
+    """Latest RunEventLog per session; finished logs linger for reconnects."""
+
+    def __init__(self, ttl_s: float = EVENT_LOG_TTL_S):
+        self.ttl_s = ttl_s
+        self._logs: Dict[str, RunEventLog] = {}
+
+    def get(self, session_id: str) -> Optional[RunEventLog]:
+        return self._logs.get(session_id)
+
+    def start(self, session_id: str) -> RunEventLog:
+        self._prune()
+        prev = self._logs.get(session_id)
+        # ponytail: ids keep increasing across runs so stale Last-Event-IDs never match
+        log = RunEventLog(first_id=prev.next_id if prev else 1)
+        if prev:
+            prev.close()
+        self._logs[session_id] = log
+        return log
+
+    def logs(self) -> list[RunEventLog]:
+        return list(self._logs.values())
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for sid, log in list(self._logs.items()):
+            if log.closed_at is not None and now - log.closed_at > self.ttl_s:
+                del self._logs[sid]
+
+
+event_logs = EventLogRegistry()
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from codeforge.config import settings
+
+Key = Tuple[str, str]
+
+
+class FileMirror:
+    """In-process copy of sandbox file contents (byte-bounded LRU).
+
+    Keyed by (sandbox_id, project-relative path). Every entry is stamped
+    with the sandbox's epoch — a token the caller keeps in shared state and
+    replaces whenever any worker writes a file or runs something that may
+    touch the filesystem (shell commands, terminal, checks, dev server) —
+    and is only served while that epoch is still current, so one worker's
+    mirror never outlives another worker's change. A local generation also
+    bumps on every change so a fetch racing an invalidation never stores
+    stale content.
+
+    Holds decoded text for the agent's file tools only; byte-exact reads
+    (/files downloads, ranges, digests) always go to the sandbox.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // 8
+        self.size = 0
+        self._entries: "OrderedDict[Key, Tuple[str, int, str]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def generation(self, sandbox_id: str) -> int:
+        return self._generations.get(sandbox_id, 0)
+
+    def get(self, sandbox_id: str, path: str, epoch: str) -> Optional[str]:
+        entry = self._entries.get((sandbox_id, path))
+        if entry is None:
+            return None
+        if entry[2] != epoch:
+            self._drop((sandbox_id, path))
+            return None
+        self._entries.move_to_end((sandbox_id, path))
+        return entry[0]
+
+    def put(
+        self, sandbox_id: str, path: str, content: str, epoch: str, *, generation: Optional[int] = None,
+    ) -> None:
+        """Store content; with `generation`, only if nothing changed since it was read."""
+        if generation is not None and generation != self.generation(sandbox_id):
+            return
+        self._drop((sandbox_id, path))
+        nbytes = len(content.encode("utf-8"))
+        if nbytes > self.max_entry_bytes:
+            return
+        self._entries[(sandbox_id, path)] = (content, nbytes, epoch)
+        self.size += nbytes
+        while self.size > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+
+    def wrote(self, sandbox_id: str, path: str, content: str, epoch: str) -> None:
+        """Our own write under a fresh epoch: older entries are stale, this one isn't."""
+        self.invalidate(sandbox_id)
+        self.put(sandbox_id, path, content, epoch)
+
+    def invalidate(self, sandbox_id: str) -> None:
+        self._generations[sandbox_id] = self.generation(sandbox_id) + 1
+        for key in [k for k in self._entries if k[0] == sandbox_id]:
+            self._drop(key)
+
+    def _drop(self, key: Key) -> None:
+        entry = self._entries.pop(key, None)
+        if entry:
+            self.size -= entry[1]
+
+
+file_mirror = FileMirror(max_bytes=settings.file_mirror_max_bytes)
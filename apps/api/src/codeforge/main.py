@@ -1,19 +1,36 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
+import mimetypes
 import os
+import re
+import time
 from contextlib import asynccontextmanager
-from typing import Dict
+from typing import Dict, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import PlainTextResponse
+from e2b.exceptions import NotFoundException
+from fastapi.responses import Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from codeforge import db
-from codeforge.agent.messages import rows_to_ui_messages
-from codeforge.agent_runtime import abort_run, is_agent_running, needs_run, start_message, start_run
+from codeforge.agent_runtime import (
+    KEEPALIVE_S,
+    abort_run,
+    attach_events,
+    is_agent_running,
+    needs_run,
+    start_message,
+    start_run,
+    stream_sse,
+)
+from codeforge.compression import CompressionMiddleware
 from codeforge.config import REPO_ROOT, settings
 from codeforge.db import SessionLocal, init_db
+from codeforge.dev_log import DEV_LOG_MAX_LINES
+from codeforge.metrics import REQUEST_LATENCY
 from codeforge.schemas import (
     CreateSessionRequest,
     CreateSessionResponse,
@@ -26,28 +43,36 @@ from codeforge.schemas import (
     SessionSummary,
     TerminalRequest,
 )
-from codeforge.sandbox import E2BSandbox, get_terminal_cwd, terminal_prompt
-
-os.environ["E2B_API_KEY"] = settings.e2b_api_key
-
-_preview_locks: Dict[str, asyncio.Lock] = {}
-
-
-def _preview_lock(session_id: str) -> asyncio.Lock:
-    if session_id not in _preview_locks:
-        _preview_locks[session_id] = asyncio.Lock()
-    return _preview_locks[session_id]
+from codeforge.sandbox import get_terminal_cwd, terminal_prompt
+from codeforge.sandbox_lifecycle import sandbox_lifecycle
+from codeforge.sandbox_pool import sandbox_pool
+from codeforge.shared_state import locked, shared_state
+from codeforge.transcript import add_user_message, ensure_ui_turns
+from codeforge.warm_pool import warm_pool
+from codeforge.write_queue import write_queue
 
+if settings.e2b_api_key:
+    os.environ["E2B_API_KEY"] = settings.e2b_api_key
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    if not settings.deepseek_api_key:
+        raise RuntimeError("DEEPSEEK_API_KEY is not set")
     (REPO_ROOT / "data").mkdir(exist_ok=True)
     await init_db()
+    write_queue.start()
+    warm_pool.start()
+    sandbox_lifecycle.start()
     yield
+    await sandbox_lifecycle.close()
+    await warm_pool.close()
+    await write_queue.close()
+    await shared_state.close()
 
 
 app = FastAPI(title="CodeForge API", lifespan=lifespan)
 
+app.add_middleware(CompressionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[settings.cors_origin],
@@ -57,11 +82,48 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    started = time.monotonic()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_LATENCY.labels(
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status),
+        ).observe(time.monotonic() - started)
+
+
+def _etag(*parts: object) -> str:
+    return '"' + hashlib.sha1("\x1f".join(map(str, parts)).encode()).hexdigest()[:20] + '"'
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
 @app.get("/health")
 async def health():
     return {"ok": True}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/api/sessions", response_model=ListSessionsResponse)
 async def list_sessions():
     async with SessionLocal() as session:
@@ -83,19 +145,41 @@ async def create_session(body: CreateSessionRequest):
     async with SessionLocal() as session:
         row = await db.create_session(session, body.title)
         if body.message:
-            await db.add_message(session, row.id, "user", body.message.strip())
+            await add_user_message(row.id, body.message.strip())
         return CreateSessionResponse(id=row.id, title=row.title, sandbox_id=row.sandbox_id)
 
 
 @app.get("/api/sessions/{session_id}", response_model=GetSessionResponse)
-async def get_session(session_id: str):
+async def get_session(
+    response: Response,
+    session_id: str,
+    limit: int = Query(default=50, ge=1, le=500, description="UI turns per page"),
+    before: Optional[str] = Query(default=None, description="before_cursor from a previous page"),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    try:
+        before_seq = int(before) if before else None
+    except ValueError as e:
+        raise HTTPException(400, "Invalid cursor") from e
+
     async with SessionLocal() as session:
         row = await db.get_session(session, session_id)
         if not row:
             raise HTTPException(404, "Session not found")
 
-        msgs = await db.list_messages(session, session_id)
-        ui_messages = rows_to_ui_messages(msgs)
+        last = await db.last_message(session, session_id)
+        running = await is_agent_running(session_id)
+        # ponytail: seq moves on every persisted row; 304 before touching ui_turns
+        etag = _etag(
+            last.seq if last else 0, running, row.title, row.sandbox_id, row.sandbox_state, limit, before,
+        )
+        if _matches(if_none_match, etag):
+            return _not_modified(etag)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+
+        await ensure_ui_turns(session, session_id)
+        turns, cursor = await db.list_ui_turn_page(session, session_id, limit=limit, before=before_seq)
 
         return GetSessionResponse(
             id=row.id,
@@ -104,74 +188,177 @@ async def get_session(session_id: str):
             sandbox_state=row.sandbox_state,  # type: ignore[arg-type]
             messages=[
                 SessionMessage(
-                    id=m["id"],
-                    role=m["role"],  # type: ignore[arg-type]
-                    content=m.get("content", ""),
-                    blocks=m.get("blocks"),
-                    created_at=m["created_at"],
+                    id=t.id,
+                    role=t.role,  # type: ignore[arg-type]
+                    content=t.content,
+                    blocks=t.blocks,
+                    created_at=t.created_at.isoformat(),
                 )
-                for m in ui_messages
+                for t in turns
             ],
-            needs_run=needs_run(msgs),
-            agent_running=is_agent_running(session_id),
+            before_cursor=str(cursor) if cursor is not None else None,
+            needs_run=needs_run([last] if last else []),
+            agent_running=running,
         )
 
 
+_TRUSTED_PROXIES = {h.strip() for h in settings.trusted_proxies.split(",") if h.strip()}
+
+
+def _user_key(request: Request) -> str:
+    """Scheduler fairness key: X-User-Id from a trusted proxy, else the client IP."""
+    peer = request.client.host if request.client else "anonymous"
+    # ponytail: anyone can send the header — only a proxy we run may name the user
+    if peer in _TRUSTED_PROXIES:
+        return request.headers.get("x-user-id") or peer
+    return peer
+
+
 @app.post("/api/sessions/{session_id}/run")
-async def run_session(session_id: str):
-    return await start_run(session_id)
+async def run_session(session_id: str, request: Request):
+    return await start_run(session_id, _user_key(request))
 
 
 @app.post("/api/sessions/{session_id}/messages")
-async def send_message(session_id: str, body: SendMessageRequest):
-    return await start_message(session_id, body.content)
+async def send_message(session_id: str, body: SendMessageRequest, request: Request):
+    return await start_message(session_id, body.content, _user_key(request))
+
+
+@app.get("/api/sessions/{session_id}/events")
+async def session_events(
+    session_id: str,
+    last_event_id: Optional[str] = Header(default=None),
+    after: int = Query(default=0, ge=0, description="Fallback for clients that cannot set Last-Event-ID"),
+):
+    try:
+        resume_from = int(last_event_id) if last_event_id else after
+    except ValueError as e:
+        raise HTTPException(400, "Invalid Last-Event-ID") from e
+    return attach_events(session_id, resume_from)
 
 
 @app.post("/api/sessions/{session_id}/abort")
 async def abort_session(session_id: str):
-    abort_run(session_id)
+    await abort_run(session_id)
     return {"ok": True}
 
 
 @app.get("/api/sessions/{session_id}/files", response_model=ListFilesResponse)
-async def list_session_files(session_id: str):
+async def list_session_files(
+    response: Response,
+    session_id: str,
+    if_none_match: Optional[str] = Header(default=None),
+):
     async with SessionLocal() as session:
         row = await db.get_session(session, session_id)
         if not row or not row.sandbox_id:
             return ListFilesResponse(paths=[])
 
     try:
-        sbx, _ = await E2BSandbox.connect_or_create(row.sandbox_id, settings.e2b_template)
-        return ListFilesResponse(paths=await sbx.list_project_files())
+        sbx, _ = await sandbox_pool.connect_or_create(row.sandbox_id, settings.e2b_template)
+        paths = await sbx.list_project_files()
     except Exception:
         return ListFilesResponse(paths=[])
+    etag = _etag(*paths)
+    if _matches(if_none_match, etag):
+        return _not_modified(etag)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return ListFilesResponse(paths=paths)
+
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _parse_range(header: str) -> Optional[Tuple[int, Optional[int]]]:
+    """Single `bytes=` range as (start, end); negative start is a suffix length.
+    Anything else (multi-range, junk) → None and the full file is served."""
+    m = _RANGE_RE.match(header.strip())
+    if not m or m.group(1) == m.group(2) == "":
+        return None
+    if m.group(1) == "":
+        return -int(m.group(2)), None
+    start, end = int(m.group(1)), int(m.group(2)) if m.group(2) else None
+    if end is not None and end < start:
+        return None
+    return start, end
+
+
+# ponytail: the OS registry maps .ts to Qt/MPEG types and lacks most web sources
+_SOURCE_TYPES = {
+    ".ts": "text/typescript", ".tsx": "text/typescript", ".mts": "text/typescript",
+    ".jsx": "text/javascript", ".mjs": "text/javascript", ".cjs": "text/javascript",
+}
+
+
+def _media_type(path: str) -> str:
+    media = _SOURCE_TYPES.get(os.path.splitext(path)[1].lower())
+    media = media or mimetypes.guess_type(path)[0] or "text/plain"
+    return f"{media}; charset=utf-8" if media.startswith("text/") else media
+
+
+def _file_headers(version: str) -> Dict[str, str]:
+    return {"Accept-Ranges": "bytes", "ETag": f'"{version}"', "Cache-Control": "no-cache"}
 
 
-@app.get("/api/sessions/{session_id}/files/{file_path:path}", response_class=PlainTextResponse)
-async def read_file(session_id: str, file_path: str):
+@app.get("/api/sessions/{session_id}/files/{file_path:path}")
+async def read_file(
+    session_id: str,
+    file_path: str,
+    range_: Optional[str] = Header(None, alias="Range"),
+    if_none_match: Optional[str] = Header(default=None),
+):
     async with SessionLocal() as session:
         row = await db.get_session(session, session_id)
         if not row or not row.sandbox_id:
             raise HTTPException(404, "No sandbox")
 
+    media_type = _media_type(file_path)
+    byte_range = _parse_range(range_) if range_ else None
     try:
-        sbx, _ = await E2BSandbox.connect_or_create(row.sandbox_id, settings.e2b_template)
-        return await sbx.read_file_raw(file_path)
+        sbx, _ = await sandbox_pool.connect_or_create(row.sandbox_id, settings.e2b_template)
+        if byte_range is None:
+            if if_none_match:
+                version = await sbx.file_version(file_path)
+                if _matches(if_none_match, f'"{version}"'):
+                    return _not_modified(f'"{version}"')
+                stream = await sbx.open_file_stream(file_path)
+            else:
+                # ponytail: nothing to revalidate — the stat rides alongside the open
+                version, stream = await asyncio.gather(
+                    sbx.file_version(file_path), sbx.open_file_stream(file_path),
+                )
+            return StreamingResponse(stream, media_type=media_type, headers=_file_headers(version))
+        data, start, total, version = await sbx.read_byte_range(file_path, *byte_range)
+        if _matches(if_none_match, f'"{version}"'):
+            return _not_modified(f'"{version}"')
+    except (FileNotFoundError, NotFoundException) as e:
+        raise HTTPException(404, str(e)) from e
     except Exception as e:
         raise HTTPException(500, str(e)) from e
 
+    if start >= total:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{total}"})
+    return Response(
+        data,
+        status_code=206,
+        media_type=media_type,
+        headers={**_file_headers(version), "Content-Range": f"bytes {start}-{start + len(data) - 1}/{total}"},
+    )
+
 
 @app.get("/api/sessions/{session_id}/preview", response_model=PreviewResponse)
 async def ensure_preview(session_id: str):
-    """Return live preview URL; start dev server if port 3000 is down."""
+    """Return live preview URL; start dev server if the dev port is down."""
     async with SessionLocal() as session:
         row = await db.get_session(session, session_id)
         if not row or not row.sandbox_id:
             return PreviewResponse(status="no_sandbox")
 
-    async with _preview_lock(session_id):
+    # ponytail: one dev-server launch per session across all workers
+    async with locked(f"preview:{session_id}"):
         try:
-            sbx, _ = await E2BSandbox.connect_or_create(row.sandbox_id, settings.e2b_template)
+            sbx, _ = await sandbox_pool.connect_or_create(row.sandbox_id, settings.e2b_template)
             url = await sbx.preview_url_live()
             if url:
                 return PreviewResponse(preview_url=url, status="ready")
@@ -185,6 +372,35 @@ async def ensure_preview(session_id: str):
             return PreviewResponse(status="error", output=str(e))
 
 
+@app.post("/api/sessions/{session_id}/preview/heartbeat", status_code=204)
+async def preview_heartbeat(session_id: str):
+    """Sent by an open preview tab; iframe traffic never reaches the API."""
+    await sandbox_lifecycle.touch(session_id)
+    return Response(status_code=204)
+
+
+@app.get("/api/sessions/{session_id}/dev-logs")
+async def dev_logs(
+    session_id: str,
+    lines: int = Query(default=200, ge=0, le=DEV_LOG_MAX_LINES, description="Backlog lines on connect"),
+    last_event_id: Optional[str] = Header(default=None),
+):
+    """Live dev-server stdout/stderr (SSE): backlog snapshot, then new lines."""
+    async with SessionLocal() as session:
+        row = await db.get_session(session, session_id)
+        if not row or not row.sandbox_id:
+            raise HTTPException(404, "No sandbox")
+    try:
+        after = int(last_event_id) if last_event_id else 0
+    except ValueError as e:
+        raise HTTPException(400, "Invalid Last-Event-ID") from e
+
+    sbx, _ = await sandbox_pool.connect_or_create(row.sandbox_id, settings.e2b_template)
+    follow = sbx.dev_log.follow(after, backlog=lines, keepalive_s=KEEPALIVE_S)
+    # ponytail: an open terminal tab keeps the sandbox from being paused
+    return stream_sse(sandbox_lifecycle.held(session_id, follow))
+
+
 @app.post("/api/sessions/{session_id}/terminal")
 async def terminal(session_id: str, body: TerminalRequest):
     async with SessionLocal() as session:
@@ -192,9 +408,9 @@ async def terminal(session_id: str, body: TerminalRequest):
         if not row or not row.sandbox_id:
             raise HTTPException(404, "No sandbox")
 
-    sbx, _ = await E2BSandbox.connect_or_create(row.sandbox_id, settings.e2b_template)
+    sbx, _ = await sandbox_pool.connect_or_create(row.sandbox_id, settings.e2b_template)
     result = await sbx.run_terminal(session_id, body.command)
-    cwd = get_terminal_cwd(session_id)
+    cwd = await get_terminal_cwd(session_id)
     return {
         "output": result.output,
         "isError": result.is_error,
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Exposed at GET /metrics in Prometheus text format.
+
+REQUEST_LATENCY = Histogram(
+    "codeforge_http_request_duration_seconds",
+    "HTTP request latency until response start",
+    ["method", "route", "status"],
+)
+ACTIVE_RUNS = Gauge("codeforge_active_runs", "Agent runs currently in progress")
+RUN_QUEUE_DEPTH = Gauge("codeforge_run_queue_depth", "Agent runs waiting for a slot")
+RUN_QUEUE_WAIT = Histogram(
+    "codeforge_run_queue_wait_seconds",
+    "Time an agent run waited for admission",
+    buckets=(0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+SSE_SUBSCRIBERS = Gauge("codeforge_sse_subscribers", "Open SSE event streams")
+SSE_QUEUE_DEPTH = Gauge("codeforge_sse_queue_depth", "Events buffered for SSE subscribers")
+SSE_TEXT_DROPPED = Counter(
+    "codeforge_sse_text_dropped_total",
+    "Text deltas dropped for subscribers whose buffer was full",
+)
+SANDBOX_CONNECT = Histogram(
+    "codeforge_sandbox_connect_seconds",
+    "connect_or_create latency by outcome (reused, connected, resumed, warm, created)",
+    ["outcome"],
+)
+SANDBOX_LIFECYCLE = Counter(
+    "codeforge_sandbox_lifecycle_total",
+    "Lifecycle manager actions (extended, paused, dead, reaped)",
+    ["action"],
+)
+WARM_POOL_CLAIMS = Counter(
+    "codeforge_warm_pool_claims_total",
+    "Warm sandbox claims by outcome (hit, miss)",
+    ["outcome"],
+)
+WARM_POOL_READY = Gauge("codeforge_warm_pool_ready", "Warm sandboxes ready to claim")
+FILE_MIRROR_READS = Counter(
+    "codeforge_file_mirror_reads_total",
+    "Sandbox file reads by mirror outcome (hit, miss)",
+    ["outcome"],
+)
+TOOL_DURATION = Histogram(
+    "codeforge_tool_duration_seconds",
+    "Agent tool call duration",
+    ["tool"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+LLM_TOKENS = Counter(
+    "codeforge_llm_tokens_total",
+    "LLM tokens by kind (input, output, cacheRead, cacheMiss)",
+    ["kind"],
+)
+LLM_TURNS = Counter(
+    "codeforge_llm_turns_total",
+    "LLM responses by prompt-cache outcome",
+    ["cache"],
+)
+
+
+def record_llm_usage(turn: dict[str, int]) -> None:
+    for kind, tokens in turn.items():
+        if tokens:
+            LLM_TOKENS.labels(kind=kind).inc(tokens)
+    LLM_TURNS.labels(cache="hit" if turn.get("cacheRead") else "miss").inc()
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Deque, Dict, Optional
+
+from codeforge.config import settings
+from codeforge.metrics import ACTIVE_RUNS, RUN_QUEUE_DEPTH, RUN_QUEUE_WAIT
+
+PositionCallback = Callable[[int], None]
+
+
+@dataclass
+class _Waiter:
+    on_position: Optional[PositionCallback]
+    admitted: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+    position: int = 0
+
+
+class RunScheduler:
+    """Admission control for agent runs in this worker.
+
+    At most max_running runs execute at once, and at most max_per_user for
+    any one user — counted in this process only; N workers admit up to N
+    times as many. Waiting runs queue FIFO per user; free slots go to users in
+    round-robin order so one user's burst can't starve everyone else. Each
+    waiter hears its (1-based) queue position whenever it changes.
+    """
+
+    def __init__(self, *, max_running: int, max_per_user: int):
+        self.max_running = max_running
+        self.max_per_user = max_per_user
+        self.running = 0
+        self._per_user: Dict[str, int] = {}
+        # ponytail: key order is the rotation — a served user moves to the back
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+
+    def queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    @asynccontextmanager
+    async def slot(self, user: str, on_position: Optional[PositionCallback] = None) -> AsyncIterator[None]:
+        started = time.monotonic()
+        waiter = _Waiter(on_position)
+        self._queues.setdefault(user, deque()).append(waiter)
+        self._dispatch()
+        try:
+            await asyncio.shield(waiter.admitted)
+        except asyncio.CancelledError:
+            if waiter.admitted.done():
+                self._release(user)
+            else:
+                self._remove(user, waiter)
+            raise
+        RUN_QUEUE_WAIT.observe(time.monotonic() - started)
+        try:
+            yield
+        finally:
+            self._release(user)
+
+    def _admissible(self, user: str) -> bool:
+        return self._per_user.get(user, 0) < self.max_per_user
+
+    def _dispatch(self) -> None:
+        while self.running < self.max_running:
+            user = next((u for u in self._queues if self._admissible(u)), None)
+            if user is None:
+                break
+            queue = self._queues[user]
+            waiter = queue.popleft()
+            if queue:
+                self._queues.move_to_end(user)
+            else:
+                del self._queues[user]
+            self.running += 1
+            self._per_user[user] = self._per_user.get(user, 0) + 1
+            waiter.admitted.set_result(None)
+        self._announce()
+
+    def _release(self, user: str) -> None:
+        self.running -= 1
+        self._per_user[user] -= 1
+        if not self._per_user[user]:
+            del self._per_user[user]
+        self._dispatch()
+
+    def _remove(self, user: str, waiter: _Waiter) -> None:
+        queue = self._queues.get(user)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[user]
+        self._announce()
+
+    def _announce(self) -> None:
+        """Positions in service order: round r takes the r-th waiter of each user."""
+        queues = list(self._queues.values())
+        position, depth = 0, 0
+        while queues:
+            for queue in queues:
+                waiter = queue[depth]
+                position += 1
+                if waiter.position != position:
+                    waiter.position = position
+                    if waiter.on_position:
+                        waiter.on_position(position)
+            depth += 1
+            queues = [q for q in queues if len(q) > depth]
+
+
+run_scheduler = RunScheduler(
+    max_running=settings.worker_max_runs,
+    max_per_user=settings.worker_max_runs_per_user,
+)
+ACTIVE_RUNS.set_function(lambda: run_scheduler.running)
+RUN_QUEUE_DEPTH.set_function(run_scheduler.queued)
@@ -1,20 +1,48 @@
 from __future__ import annotations
 
 import asyncio
+import base64
+import re
 import shlex
-from typing import Callable, Dict, Optional, Tuple, Union
+import uuid
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Union
 
-from e2b import Sandbox
 from e2b.sandbox.commands.command_handle import CommandExitException
 
 from codeforge.config import settings
+from codeforge.dev_log import DevLog, StreamMatcher
+from codeforge.file_mirror import file_mirror
+from codeforge.metrics import FILE_MIRROR_READS
+from codeforge.sandbox_backend import APP_ROOT, SANDBOX_METADATA, SandboxBackend, backend_class
 from codeforge.schemas import ToolResult
+from codeforge.shared_state import shared_state
 
-APP_ROOT = "/home/user"
 MAX_OUTPUT = 4000
 EXCLUDED = {"node_modules", ".next", ".git", "dist", "build"}
-_terminal_cwd: Dict[str, str] = {}
-_project_dirs: Dict[str, str] = {}
+SANDBOX_TIMEOUT_S = 30 * 60
+DEV_START_TIMEOUT_S = 90
+DEV_FALLBACK_PROBE_S = 10
+DEV_ERROR_TAIL_LINES = 80
+DEV_READY_MARKERS = ("ready in", "local:", "ready on", "started server on")
+DEV_FATAL_MARKERS = ("enoent", "missing script", "cannot find module", "command not found", "npm err!")
+TERMINAL_CWD_TTL_S = 24 * 60 * 60
+MIRROR_EPOCH_TTL_S = 24 * 60 * 60
+# size and mtime (ns) — a file's version without hashing its contents
+_STAT_VERSION = "stat -c '%s %.9Y'"
+DEV_PORT = 3000
+
+# One round trip: every package.json outside node_modules as "<score> <dir>".
+_PROJECT_SCAN = (
+    f"find {APP_ROOT} -maxdepth 5 -name package.json ! -path '*/node_modules/*' 2>/dev/null"
+    " | while IFS= read -r f; do s=0;"
+    " grep -q next \"$f\" && s=$((s+3)); grep -q vite \"$f\" && s=$((s+3));"
+    " grep -q '\"dev\"' \"$f\" && s=$((s+2)); grep -q react \"$f\" && s=$((s+1));"
+    " echo \"$s ${f%/package.json}\"; done"
+)
+# ponytail: shell commands that may create, move or delete a project manifest
+_SCAFFOLD_RE = re.compile(r"\b(create|init|degit|clone|mv|rm|cp|tar|unzip)\b|package\.json")
 
 
 def _is_ignored_file(rel: str) -> bool:
@@ -24,11 +52,21 @@ def _is_ignored_file(rel: str) -> bool:
     return any(p.startswith(".") for p in parts)
 
 
-def _cache_project_dir(sandbox_id: str, path: str) -> None:
-    top = path.split("/")[0]
-    if not top or top.startswith("."):
-        return
-    _project_dirs[sandbox_id] = f"{APP_ROOT}/{top}"
+# ponytail: one log per sandbox for as long as a handle or a follower holds it, so a
+# dev-logs stream keeps flowing when its handle is evicted or the sandbox resumes
+_dev_logs: "weakref.WeakValueDictionary[str, DevLog]" = weakref.WeakValueDictionary()
+
+
+def _dev_log(sandbox_id: str) -> DevLog:
+    log = _dev_logs.get(sandbox_id)
+    if log is None:
+        log = _dev_logs[sandbox_id] = DevLog()
+    return log
+
+
+def _mirrorable(rel: str) -> bool:
+    # ponytail: a running dev server keeps rewriting build output and caches behind our back
+    return not any(p in EXCLUDED or p.startswith(".") for p in rel.split("/"))
 
 
 def truncate(text: str, max_len: int = MAX_OUTPUT) -> str:
@@ -78,8 +116,8 @@ def terminal_prompt(cwd: str) -> str:
     return f"~/{rel}" if rel else "~"
 
 
-def get_terminal_cwd(session_id: str) -> str:
-    return _terminal_cwd.get(session_id, APP_ROOT)
+async def get_terminal_cwd(session_id: str) -> str:
+    return await shared_state.get(f"cwd:{session_id}") or APP_ROOT
 
 
 def _resolve_cd(cwd: str, target: str) -> Optional[str]:
@@ -113,94 +151,318 @@ def normalize_path(rel: str) -> str:
     return clean
 
 
+def _numbered(lines: List[str], first: int) -> str:
+    return "\n".join(f"{str(i).rjust(4)}| {line}" for i, line in enumerate(lines, start=first))
+
+
+def number_lines(content: str, start_line: Optional[int] = None, end_line: Optional[int] = None) -> str:
+    lines = content.split("\n")
+    start = (start_line or 1) - 1
+    end = end_line or len(lines)
+    return _numbered(lines[start:end], start + 1)
+
+
+async def _drain(stream: Any) -> AsyncIterator[bytes]:
+    async with stream:
+        async for chunk in stream:
+            yield chunk
+
+
+def _version(stat_line: str) -> Tuple[int, str]:
+    size, mtime = stat_line.split()
+    return int(size), f"{size}-{mtime.replace('.', '')}"
+
+
 def resolve_path(rel: str) -> str:
     clean = normalize_path(rel)
     return f"{APP_ROOT}/{clean}" if clean else APP_ROOT
 
 
 class E2BSandbox:
-    def __init__(self, sandbox: Sandbox):
+    """Agent/tool surface over a SandboxBackend (e2b or local)."""
+
+    def __init__(self, sandbox: SandboxBackend):
         self.sandbox = sandbox
-        self.dev_log = ""
+        self.dev_log = _dev_log(sandbox.sandbox_id)
         self.dev_handle = None
+        self._dev_watch: Optional[asyncio.Task] = None
+        self.dev_lock = asyncio.Lock()
+        # ponytail: e2b forwards :3000 per sandbox; local sandboxes bring their own host port
+        self.dev_port: int = getattr(sandbox, "dev_port", DEV_PORT)
+        # ponytail: SandboxPool backs these with the session row; it is re-read on every
+        # use because another worker may have re-detected or cleared it
         self.project_dir: Optional[str] = None
+        self.load_project_dir: Optional[Callable[[], Awaitable[Optional[str]]]] = None
+        self.on_project_dir: Optional[Callable[[Optional[str]], Awaitable[None]]] = None
 
     @classmethod
-    async def connect_or_create(
-        cls,
-        sandbox_id: Optional[str],
-        template: str,
-        on_created: Optional[Callable[[str], Union[asyncio.Future, object]]] = None,
-    ) -> Tuple["E2BSandbox", str]:
-        if sandbox_id:
-            try:
-                sbx = await asyncio.to_thread(Sandbox.connect, sandbox_id)
-                return cls(sbx), sbx.sandbox_id
-            except Exception:
-                pass
+    async def connect(cls, sandbox_id: str) -> "E2BSandbox":
+        return cls(await backend_class().connect(sandbox_id))
 
-        sbx = await asyncio.to_thread(
-            Sandbox.create,
+    @classmethod
+    async def create(cls, template: str) -> "E2BSandbox":
+        return cls(await backend_class().create(
             template,
-            timeout=30 * 60,
-        )
-        if on_created:
-            result = on_created(sbx.sandbox_id)
-            if asyncio.iscoroutine(result):
-                await result
-        return cls(sbx), sbx.sandbox_id
+            timeout=SANDBOX_TIMEOUT_S,
+            metadata=SANDBOX_METADATA,
+            # ponytail: an unattended timeout pauses instead of losing the project
+            lifecycle={"on_timeout": "pause"},
+        ))
+
+    async def is_alive(self) -> bool:
+        try:
+            return await self.sandbox.is_running(request_timeout=5)
+        except Exception:
+            return False
 
     async def preview_url_live(self) -> Optional[str]:
-        if await self._is_port_responding(3000):
-            return f"https://{self.sandbox.get_host(3000)}"
+        if await self._is_port_responding(self.dev_port):
+            # ponytail: e2b hosts are TLS-fronted; LocalSandbox serves plain http
+            scheme = getattr(self.sandbox, "url_scheme", "https")
+            return f"{scheme}://{self.sandbox.get_host(self.dev_port)}"
         return None
 
+    async def _mirror_epoch(self) -> str:
+        """The sandbox's current mirror epoch, shared by every worker."""
+        key = f"mirror:{self.sandbox.sandbox_id}"
+        epoch = await shared_state.get(key)
+        while epoch is None:
+            # ponytail: a missing (expired) epoch gets a fresh token — never one an old entry carries
+            fresh = uuid.uuid4().hex
+            epoch = fresh if await shared_state.claim(key, fresh, MIRROR_EPOCH_TTL_S) else await shared_state.get(key)
+        return epoch
+
+    async def _new_mirror_epoch(self) -> str:
+        """Retire every worker's mirror entries for this sandbox."""
+        epoch = uuid.uuid4().hex
+        await shared_state.put(f"mirror:{self.sandbox.sandbox_id}", epoch, MIRROR_EPOCH_TTL_S)
+        file_mirror.invalidate(self.sandbox.sandbox_id)
+        return epoch
+
+    async def _cached(self, rel: str) -> Optional[str]:
+        if not _mirrorable(rel):
+            return None
+        cached = file_mirror.get(self.sandbox.sandbox_id, rel, await self._mirror_epoch())
+        FILE_MIRROR_READS.labels(outcome="miss" if cached is None else "hit").inc()
+        return cached
+
+    async def _read(self, rel: str) -> str:
+        if not _mirrorable(rel):
+            return await self.sandbox.files.read(resolve_path(rel))
+        sid = self.sandbox.sandbox_id
+        epoch = await self._mirror_epoch()
+        cached = file_mirror.get(sid, rel, epoch)
+        FILE_MIRROR_READS.labels(outcome="miss" if cached is None else "hit").inc()
+        if cached is not None:
+            return cached
+        generation = file_mirror.generation(sid)
+        content = await self.sandbox.files.read(resolve_path(rel))
+        file_mirror.put(sid, rel, content, epoch, generation=generation)
+        return content
+
+    async def _write(self, rel: str, content: str) -> None:
+        await self.sandbox.files.write(resolve_path(rel), content)
+        if _mirrorable(rel):
+            file_mirror.wrote(self.sandbox.sandbox_id, rel, content, await self._new_mirror_epoch())
+
+    @asynccontextmanager
+    async def _touches_fs(self) -> AsyncIterator[None]:
+        # ponytail: new epoch before and after — reads racing the command must not stick
+        await self._new_mirror_epoch()
+        try:
+            yield
+        finally:
+            await self._new_mirror_epoch()
+
     async def write_file(self, path: str, content: str) -> ToolResult:
         try:
-            full = resolve_path(path)
-            await asyncio.to_thread(self.sandbox.files.write, full, content)
             rel = normalize_path(path)
-            _cache_project_dir(self.sandbox.sandbox_id, rel)
+            await self._write(rel, content)
+            await self._wrote([rel])
             return ToolResult(output=f"Wrote {rel} ({len(content)} bytes)", changed_paths=[rel])
         except Exception as e:
             return ToolResult(output=str(e), is_error=True)
 
     async def edit_file(self, path: str, old_str: str, new_str: str) -> ToolResult:
         try:
-            full = resolve_path(path)
-            content = await asyncio.to_thread(self.sandbox.files.read, full)
+            rel = normalize_path(path)
+            content = await self._read(rel)
             count = content.count(old_str)
             if count == 0:
                 return ToolResult(output=f"old_str not found in {path}", is_error=True)
             if count > 1:
                 return ToolResult(output=f"old_str matches {count} times — must be unique", is_error=True)
             updated = content.replace(old_str, new_str, 1)
-            await asyncio.to_thread(self.sandbox.files.write, full, updated)
-            rel = normalize_path(path)
-            _cache_project_dir(self.sandbox.sandbox_id, rel)
+            await self._write(rel, updated)
+            await self._wrote([rel])
             return ToolResult(output=f"Edited {rel}", changed_paths=[rel])
         except Exception as e:
             return ToolResult(output=str(e), is_error=True)
 
     async def read_file(self, path: str, start_line: Optional[int] = None, end_line: Optional[int] = None) -> ToolResult:
         try:
-            full = resolve_path(path)
-            content = await asyncio.to_thread(self.sandbox.files.read, full)
-            lines = content.split("\n")
-            start = (start_line or 1) - 1
-            end = end_line or len(lines)
-            numbered = "\n".join(
-                f"{str(i + 1).rjust(4)}| {line}" for i, line in enumerate(lines[start:end], start=start)
-            )
-            return ToolResult(output=numbered)
+            rel = normalize_path(path)
+            if not (start_line or end_line):
+                return ToolResult(output=number_lines(await self._read(rel)))
+            cached = await self._cached(rel)
+            if cached is not None:
+                return ToolResult(output=number_lines(cached, start_line, end_line))
+            return ToolResult(output=await self._read_lines(rel, start_line, end_line))
         except Exception as e:
             return ToolResult(output=str(e), is_error=True)
 
+    async def _read_lines(self, rel: str, start_line: Optional[int], end_line: Optional[int]) -> str:
+        # ponytail: window cut inside the sandbox — only the slice crosses the wire
+        first = max(start_line or 1, 1)
+        last = end_line or "$"
+        r = await self.sandbox.commands.run(
+            f"sed -n '{first},{last}p' -- {shlex.quote(resolve_path(rel))}", timeout=30,
+        )
+        lines = r.stdout.split("\n")
+        if lines and lines[-1] == "":
+            lines.pop()
+        return _numbered(lines, first)
+
+    async def read_byte_range(
+        self, path: str, start: int, end: Optional[int] = None,
+    ) -> Tuple[bytes, int, int, str]:
+        """Bytes [start, end] (inclusive; negative start = suffix length).
+
+        Returns (data, absolute start, total size, version); data is empty
+        when start is past the end of the file. The version (see
+        file_version) comes from the same command as the bytes.
+        """
+        rel = normalize_path(path)
+        full = shlex.quote(resolve_path(rel))
+        if start < 0:
+            cut = f"tail -c {-start} -- {full}"
+        else:
+            cut = f"tail -c +{start + 1} -- {full}"
+            if end is not None:
+                cut += f" | head -c {max(end - start + 1, 0)}"
+        try:
+            r = await self.sandbox.commands.run(
+                f"{_STAT_VERSION} -- {full} && {cut} | base64 -w0", timeout=60,
+            )
+        except CommandExitException as e:
+            if "No such file" in e.stderr:
+                raise FileNotFoundError(f"{rel}: No such file or directory") from e
+            raise
+        stat_line, _, encoded = r.stdout.partition("\n")
+        total, version = _version(stat_line)
+        data = base64.b64decode(encoded.strip())
+        first = max(total + start, 0) if start < 0 else start
+        return data, first, total, version
+
+    async def file_version(self, path: str) -> str:
+        """Cache validator from size and mtime — one stat, no read of the contents."""
+        rel = normalize_path(path)
+        full = shlex.quote(resolve_path(rel))
+        try:
+            r = await self.sandbox.commands.run(f"{_STAT_VERSION} -- {full}", timeout=30)
+        except CommandExitException as e:
+            if "No such file" in e.stderr:
+                raise FileNotFoundError(f"{rel}: No such file or directory") from e
+            raise
+        return _version(r.stdout.strip())[1]
+
+    async def open_file_stream(self, path: str) -> AsyncIterator[bytes]:
+        """Whole file as a byte stream."""
+        rel = normalize_path(path)
+        stream = await self.sandbox.files.read(resolve_path(rel), format="stream")
+        return _drain(stream)
+
+    async def apply_file_ops(self, ops: List[Dict[str, Any]]) -> ToolResult:
+        """Apply read/write/edit ops in one pass: parallel fetch, in-memory
+        validation, then parallel upload of every touched file."""
+        results: list[str] = [""] * len(ops)
+        failed: set[int] = set()
+        paths: list[Optional[str]] = []
+        for i, op in enumerate(ops):
+            try:
+                rel = normalize_path(str(op.get("path", "")))
+                if not rel:
+                    raise ValueError("path is required")
+                paths.append(rel)
+            except ValueError as e:
+                paths.append(None)
+                results[i] = str(e)
+                failed.add(i)
+
+        # ponytail: fetch only files whose first op in the batch needs existing content
+        first_op: dict[str, str] = {}
+        for op, rel in zip(ops, paths):
+            if rel and rel not in first_op:
+                first_op[rel] = op.get("op", "")
+        to_fetch = [rel for rel, kind in first_op.items() if kind in ("read", "edit")]
+        fetched = await asyncio.gather(
+            *(self._read(rel) for rel in to_fetch),
+            return_exceptions=True,
+        )
+        state: dict[str, Union[str, BaseException]] = dict(zip(to_fetch, fetched))
+        dirty: list[str] = []
+
+        for i, (op, rel) in enumerate(zip(ops, paths)):
+            if rel is None:
+                continue
+            kind = op.get("op")
+            if kind == "write":
+                content = str(op.get("content") or "")
+                state[rel] = content
+                if rel not in dirty:
+                    dirty.append(rel)
+                results[i] = f"Wrote {rel} ({len(content)} bytes)"
+                continue
+            current = state.get(rel)
+            if isinstance(current, BaseException) or current is None:
+                results[i] = str(current) if current is not None else f"{rel}: not loaded"
+                failed.add(i)
+            elif kind == "read":
+                results[i] = number_lines(current, op.get("start_line"), op.get("end_line"))
+            elif kind == "edit":
+                old_str = str(op.get("old_str") or "")
+                count = current.count(old_str) if old_str else 0
+                if count == 0:
+                    results[i] = f"old_str not found in {rel}"
+                    failed.add(i)
+                elif count > 1:
+                    results[i] = f"old_str matches {count} times — must be unique"
+                    failed.add(i)
+                else:
+                    state[rel] = current.replace(old_str, str(op.get("new_str") or ""), 1)
+                    if rel not in dirty:
+                        dirty.append(rel)
+                    results[i] = f"Edited {rel}"
+            else:
+                results[i] = f"Unknown op: {kind}"
+                failed.add(i)
+
+        uploads = await asyncio.gather(
+            *(self._write(rel, state[rel]) for rel in dirty),
+            return_exceptions=True,
+        )
+        changed: list[str] = []
+        for rel, up in zip(dirty, uploads):
+            if isinstance(up, BaseException):
+                for i, p in enumerate(paths):
+                    if p == rel and ops[i].get("op") in ("write", "edit") and i not in failed:
+                        results[i] = f"Upload failed for {rel}: {up}"
+                        failed.add(i)
+                continue
+            changed.append(rel)
+        await self._wrote(changed)
+
+        output = "\n\n".join(
+            f"[{i + 1}] {op.get('op', '?')} {op.get('path', '')}"
+            f"{' (error)' if i in failed else ''}:\n{text}"
+            for i, (op, text) in enumerate(zip(ops, results))
+        )
+        return ToolResult(output=output or "(no ops)", is_error=bool(failed), changed_paths=changed)
+
     async def _scan_files(self, root: str, *, maxdepth: Optional[int] = None) -> list[str]:
         depth = f"-maxdepth {maxdepth} " if maxdepth else ""
         try:
-            result = await asyncio.to_thread(
-                self.sandbox.commands.run,
+            result = await self.sandbox.commands.run(
                 f'find "{root}" {depth}-type f '
                 f'! -path "*/node_modules/*" ! -path "*/.next/*" ! -path "*/.git/*" '
                 f'2>/dev/null | head -1000',
@@ -224,33 +486,10 @@ class E2BSandbox:
 
     async def list_project_files(self) -> list[str]:
         project = await self._find_project_dir()
-        if project != APP_ROOT:
-            return await self._scan_files(project)
-
-        # ponytail: never list /home/user dotfiles — scan known project roots only
-        paths: list[str] = []
-        for root in await self._project_roots():
-            paths.extend(await self._scan_files(root))
-        return sorted(set(paths))
-
-    async def _project_roots(self) -> list[str]:
-        roots: list[str] = []
-        try:
-            r = await asyncio.to_thread(
-                self.sandbox.commands.run,
-                f'find {APP_ROOT} -maxdepth 4 -name package.json ! -path "*/node_modules/*" 2>/dev/null',
-                timeout=15,
-            )
-            for line in r.stdout.splitlines():
-                pkg = line.strip()
-                if not pkg:
-                    continue
-                root = pkg.rsplit("/package.json", 1)[0]
-                if root != APP_ROOT and root not in roots:
-                    roots.append(root)
-        except Exception:
-            pass
-        return roots
+        if project == APP_ROOT:
+            # ponytail: no manifest (e.g. static HTML) — shallow listing; dotfiles are filtered
+            return await self._scan_files(APP_ROOT, maxdepth=3)
+        return await self._scan_files(project)
 
     async def list_files(self, path: str = ".") -> ToolResult:
         try:
@@ -261,9 +500,14 @@ class E2BSandbox:
             return ToolResult(output=str(e), is_error=True)
 
     async def run_command(self, command: str, timeout_s: int = 120) -> ToolResult:
+        async with self._touches_fs():
+            result = await self._run_command(command, timeout_s)
+        await self._ran(command)
+        return result
+
+    async def _run_command(self, command: str, timeout_s: int) -> ToolResult:
         try:
-            result = await asyncio.to_thread(
-                self.sandbox.commands.run,
+            result = await self.sandbox.commands.run(
                 command,
                 cwd=APP_ROOT,
                 timeout=timeout_s,
@@ -283,7 +527,17 @@ class E2BSandbox:
             return ToolResult(output=str(e), is_error=True)
 
     async def run_terminal(self, session_id: str, command: str, timeout_s: int = 120) -> ToolResult:
-        cwd = _terminal_cwd.get(session_id, APP_ROOT)
+        async with self._touches_fs():
+            result = await self._run_terminal(session_id, command, timeout_s)
+        await self._ran(command)
+        return result
+
+    async def _ran(self, command: str) -> None:
+        if _SCAFFOLD_RE.search(command):
+            await self._set_project_dir(None)
+
+    async def _run_terminal(self, session_id: str, command: str, timeout_s: int) -> ToolResult:
+        cwd = await get_terminal_cwd(session_id)
         cmd = command.strip()
         if not cmd:
             return ToolResult(output="", is_error=False)
@@ -298,8 +552,7 @@ class E2BSandbox:
                     is_error=True,
                 )
             try:
-                check = await asyncio.to_thread(
-                    self.sandbox.commands.run,
+                check = await self.sandbox.commands.run(
                     f"test -d {shlex.quote(new_cwd)}",
                     timeout=5,
                 )
@@ -313,13 +566,12 @@ class E2BSandbox:
                     output=f"cd: {target or '~'}: No such file or directory",
                     is_error=True,
                 )
-            _terminal_cwd[session_id] = new_cwd
+            await shared_state.put(f"cwd:{session_id}", new_cwd, ttl_s=TERMINAL_CWD_TTL_S)
             return ToolResult(output="", is_error=False)
 
         shell_cmd = f"bash -lc {shlex.quote(cmd)}"
         try:
-            result = await asyncio.to_thread(
-                self.sandbox.commands.run,
+            result = await self.sandbox.commands.run(
                 shell_cmd,
                 cwd=cwd,
                 timeout=timeout_s,
@@ -338,170 +590,174 @@ class E2BSandbox:
         except Exception as e:
             return ToolResult(output=str(e), is_error=True)
 
+    async def _set_project_dir(self, project_dir: Optional[str]) -> None:
+        # ponytail: always written — our copy may be stale, so "unchanged" can't be trusted
+        self.project_dir = project_dir
+        if self.on_project_dir:
+            await self.on_project_dir(project_dir)
+
+    async def _wrote(self, rels: List[str]) -> None:
+        if any(rel.rsplit("/", 1)[-1] == "package.json" for rel in rels):
+            await self._set_project_dir(None)
+
     async def _find_project_dir(self) -> str:
-        sid = self.sandbox.sandbox_id
-        cached = _project_dirs.get(sid)
-        if cached:
-            self.project_dir = cached
-            return cached
-        if self.project_dir and self.project_dir != APP_ROOT:
+        if self.load_project_dir:
+            self.project_dir = await self.load_project_dir()
+        if self.project_dir:
             return self.project_dir
 
         candidates: list[tuple[int, int, str]] = []
         try:
-            r = await asyncio.to_thread(
-                self.sandbox.commands.run,
-                f'find {APP_ROOT} -maxdepth 5 -name package.json ! -path "*/node_modules/*" 2>/dev/null',
-                timeout=15,
-            )
+            r = await self.sandbox.commands.run(_PROJECT_SCAN, timeout=15)
             for line in r.stdout.splitlines():
-                pkg = line.strip()
-                if not pkg:
-                    continue
-                try:
-                    content = await asyncio.to_thread(self.sandbox.files.read, pkg)
-                except Exception:
-                    continue
-                root = pkg.rsplit("/package.json", 1)[0]
-                if root == APP_ROOT:
-                    continue
-                score = 0
-                if "next" in content:
-                    score += 3
-                if "vite" in content:
-                    score += 3
-                if '"dev"' in content:
-                    score += 2
-                if "react" in content:
-                    score += 1
-                candidates.append((score, root.count("/"), root))
+                score, _, root = line.strip().partition(" ")
+                if root and root != APP_ROOT:
+                    candidates.append((int(score), root.count("/"), root))
         except Exception:
             pass
 
-        if candidates:
-            candidates.sort(key=lambda x: (-x[0], x[1]))
-            self.project_dir = candidates[0][2]
-            _project_dirs[sid] = self.project_dir
-            return self.project_dir
-
-        self.project_dir = APP_ROOT
-        return APP_ROOT
-
-    async def _is_port_listening(self, port: int) -> bool:
-        try:
-            r = await asyncio.to_thread(
-                self.sandbox.commands.run,
-                f"ss -tlnH 'sport = :{port}' 2>/dev/null | head -1",
-                timeout=5,
-            )
-            line = r.stdout.strip()
-            # E2B port forwarding needs 0.0.0.0, not localhost-only
-            return bool(line) and ("0.0.0.0" in line or "*:" in line or "[::]:" in line)
-        except Exception:
-            return False
+        if not candidates:
+            # ponytail: not persisted — rescan until a manifest shows up
+            return APP_ROOT
+        candidates.sort(key=lambda x: (-x[0], x[1]))
+        await self._set_project_dir(candidates[0][2])
+        return candidates[0][2]
 
     async def _is_port_responding(self, port: int) -> bool:
-        if not await self._is_port_listening(port):
-            return False
+        # ponytail: one probe process — E2B forwarding needs 0.0.0.0, not localhost-only
+        probe = (
+            f"ss -tlnH 'sport = :{port}' 2>/dev/null | grep -qE '0\\.0\\.0\\.0|\\*:|\\[::\\]:' "
+            f"&& curl -s -o /dev/null -w '%{{http_code}}' --connect-timeout 2 http://127.0.0.1:{port}/ 2>/dev/null "
+            f"|| echo 000"
+        )
         try:
-            r = await asyncio.to_thread(
-                self.sandbox.commands.run,
-                f"curl -s -o /dev/null -w '%{{http_code}}' --connect-timeout 2 http://127.0.0.1:{port}/ 2>/dev/null || echo 000",
-                timeout=5,
-            )
+            r = await self.sandbox.commands.run(probe, timeout=5)
             code = r.stdout.strip()
             return code not in ("", "000")
         except Exception:
             return False
 
-
     async def _dev_start_command(self, project: str) -> str:
+        port = self.dev_port
         try:
-            pkg = await asyncio.to_thread(self.sandbox.files.read, f"{project}/package.json")
+            pkg = await self._read(normalize_path(f"{project}/package.json"))
             if "next" in pkg:
-                return "npx next dev -H 0.0.0.0 -p 3000"
+                return f"npx next dev -H 0.0.0.0 -p {port}"
             if "vite" in pkg:
-                return "npx vite --host 0.0.0.0 --port 3000"
+                return f"npx vite --host 0.0.0.0 --port {port}"
         except Exception:
             pass
-        return "npm run dev -- --hostname 0.0.0.0 --port 3000"
+        return f"npm run dev -- --hostname 0.0.0.0 --port {port}"
 
     async def _clear_port(self, port: int) -> None:
+        # ponytail: a local sandbox shares the host — stop only its own process groups
+        kill_background = getattr(self.sandbox, "kill_background", None)
+        if kill_background is not None:
+            kill_background()
+            return
         try:
-            await asyncio.to_thread(
-                self.sandbox.commands.run,
+            await self.sandbox.commands.run(
                 f"fuser -k {port}/tcp 2>/dev/null; pkill -f 'next dev' 2>/dev/null; pkill -f 'vite' 2>/dev/null; true",
                 timeout=10,
             )
         except CommandExitException:
             pass
 
-    def _log_has_fatal_error(self) -> Optional[str]:
-        log = self.dev_log.lower()
-        for needle in ("enoent", "missing script", "cannot find module", "command not found", "npm err!"):
-            if needle in log:
-                return needle
-        return None
-
     async def start_dev_server(self) -> ToolResult:
+        # ponytail: handle is shared by agent + /preview — one launch at a time
+        # ponytail: dev servers generate files (next-env.d.ts, tsconfig tweaks) on boot
+        async with self.dev_lock:
+            async with self._touches_fs():
+                return await self._start_dev_server()
+
+    async def _start_dev_server(self) -> ToolResult:
         url = await self.preview_url_live()
         if url:
             return ToolResult(output=f"Dev server already running at {url}", preview_url=url)
 
         project = await self._find_project_dir()
         cmd = await self._dev_start_command(project)
-        self.dev_log = ""
-        await self._clear_port(3000)
-
-        def on_stdout(data: str) -> None:
-            self.dev_log += data
-
-        def on_stderr(data: str) -> None:
-            self.dev_log += data
+        self.dev_log.clear()
+        await self._clear_port(self.dev_port)
+
+        loop = asyncio.get_running_loop()
+        signal = asyncio.Event()
+        state: dict[str, Optional[str]] = {"fatal": None, "exit": None}
+        fatal_matcher = StreamMatcher(DEV_FATAL_MARKERS)
+        ready_matcher = StreamMatcher(DEV_READY_MARKERS)
+
+        def on_output(data: str) -> None:
+            self.dev_log.append(data)
+            fatal = fatal_matcher.feed(data)
+            ready = ready_matcher.feed(data)
+            if fatal and not state["fatal"]:
+                state["fatal"] = fatal
+                signal.set()
+            elif ready:
+                signal.set()
+
+        async def watch_exit(handle) -> None:
+            try:
+                await handle.wait()
+                state["exit"] = "exited"
+            except CommandExitException as e:
+                state["exit"] = f"exited with code {e.exit_code}"
+            except Exception as e:
+                state["exit"] = f"stream closed: {e}"
+            signal.set()
 
         try:
-            self.dev_handle = await asyncio.to_thread(
-                self.sandbox.commands.run,
+            # ponytail: async handle delivers output callbacks on the loop as it streams;
+            # timeout=0 keeps the stream (and dev_log) open for the server's lifetime
+            self.dev_handle = await self.sandbox.commands.run(
                 cmd,
                 cwd=project,
                 background=True,
-                envs={"HOSTNAME": "0.0.0.0", "PORT": "3000"},
-                on_stdout=on_stdout,
-                on_stderr=on_stderr,
+                timeout=0,
+                envs={"HOSTNAME": "0.0.0.0", "PORT": str(self.dev_port)},
+                on_stdout=on_output,
+                on_stderr=on_output,
             )
         except Exception as e:
-            return ToolResult(output=truncate(f"Failed to launch dev server: {e}\n{self.dev_log}"), is_error=True)
+            return self._dev_error(f"Failed to launch dev server: {e}")
+        self._dev_watch = asyncio.create_task(watch_exit(self.dev_handle))
 
-        # ponytail: 90s cap; port must listen on 0.0.0.0, not log heuristics alone
-        for _ in range(45):
-            fatal = self._log_has_fatal_error()
-            if fatal:
-                return ToolResult(
-                    output=truncate(f"Dev server failed ({fatal}).\n{self.dev_log}"),
-                    is_error=True,
+        # ponytail: wake on ready/fatal markers; slow probe fallback for quiet frameworks
+        deadline = loop.time() + DEV_START_TIMEOUT_S
+        while loop.time() < deadline:
+            try:
+                await asyncio.wait_for(
+                    signal.wait(), timeout=min(DEV_FALLBACK_PROBE_S, deadline - loop.time()),
                 )
-            if await self._is_port_responding(3000):
-                await asyncio.sleep(1)
-                url = await self.preview_url_live()
-                if url:
-                    return ToolResult(output=f"Dev server ready at {url}", preview_url=url)
-            await asyncio.sleep(2)
+            except asyncio.TimeoutError:
+                pass
+            signal.clear()
+            if state["fatal"]:
+                return self._dev_error(f"Dev server failed ({state['fatal']}).")
+            url = await self.preview_url_live()
+            if url:
+                return ToolResult(output=f"Dev server ready at {url}", preview_url=url)
+            if state["exit"]:
+                return self._dev_error(f"Dev server {state['exit']} before becoming ready.")
 
-        return ToolResult(
-            output=truncate(f"Dev server timed out after 90s in {project}.\n{self.dev_log}"),
-            is_error=True,
-        )
+        return self._dev_error(f"Dev server timed out after {DEV_START_TIMEOUT_S}s in {project}.")
+
+    def _dev_error(self, message: str) -> ToolResult:
+        return ToolResult(output=truncate(f"{message}\n{self.dev_log.tail(DEV_ERROR_TAIL_LINES)}"), is_error=True)
 
     async def get_dev_server_logs(self, lines: int = 50) -> ToolResult:
-        log = "\n".join(self.dev_log.split("\n")[-lines:])
+        log = self.dev_log.tail(lines)
         return ToolResult(output=log or "(no logs yet)")
 
     async def check_project(self) -> ToolResult:
+        async with self._touches_fs():
+            return await self._check_project()
+
+    async def _check_project(self) -> ToolResult:
         project = await self._find_project_dir()
         tsc_code = 0
         try:
-            tsc = await asyncio.to_thread(
-                self.sandbox.commands.run,
+            tsc = await self.sandbox.commands.run(
                 "npx tsc --noEmit 2>&1",
                 cwd=project,
                 timeout=120,
@@ -515,8 +771,7 @@ class E2BSandbox:
             return ToolResult(output=str(e), is_error=True)
 
         try:
-            lint = await asyncio.to_thread(
-                self.sandbox.commands.run,
+            lint = await self.sandbox.commands.run(
                 "npx eslint . --max-warnings 0 2>&1 || true",
                 cwd=project,
                 timeout=120,
@@ -531,4 +786,4 @@ class E2BSandbox:
         )
 
     async def read_file_raw(self, path: str) -> str:
-        return await asyncio.to_thread(self.sandbox.files.read, resolve_path(path))
+        return await self._read(normalize_path(path))
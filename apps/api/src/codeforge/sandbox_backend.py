@@ -0,0 +1,378 @@
+"""Sandbox backends behind E2BSandbox.
+
+E2BSandbox only needs the slice of e2b's AsyncSandbox described by
+`SandboxBackend`. `LocalSandbox` implements the same slice with a temp
+directory and local subprocesses so the API, agent loop and tools can be
+profiled on one box without a network.
+"""
+from __future__ import annotations
+
+import asyncio
+import codecs
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import uuid
+from contextlib import suppress
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Protocol, Tuple, Type
+
+from e2b import AsyncSandbox, SandboxQuery
+from e2b.exceptions import NotFoundException, TimeoutException
+from e2b.sandbox.commands.command_handle import CommandExitException, CommandResult
+
+from codeforge.config import settings
+
+APP_ROOT = "/home/user"
+# ponytail: tags every sandbox we create so the orphan reaper never touches others
+SANDBOX_METADATA = {"app": "codeforge"}
+# Raised by backend calls when the sandbox no longer exists.
+SANDBOX_GONE = (NotFoundException, FileNotFoundError)
+OutputHandler = Callable[[str], Any]
+
+
+class SandboxFiles(Protocol):
+    async def read(self, path: str, format: str = "text") -> Any: ...
+    async def write(self, path: str, data: str) -> Any: ...
+
+
+class SandboxCommands(Protocol):
+    async def run(
+        self,
+        cmd: str,
+        *,
+        background: bool = False,
+        cwd: Optional[str] = None,
+        envs: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = 60,
+        on_stdout: Optional[OutputHandler] = None,
+        on_stderr: Optional[OutputHandler] = None,
+    ) -> Any: ...
+
+
+class SandboxBackend(Protocol):
+    """What E2BSandbox uses: files, commands (foreground raises
+    CommandExitException on non-zero exit; background returns a handle with
+    wait/kill), host lookup and lifecycle."""
+
+    sandbox_id: str
+    files: SandboxFiles
+    commands: SandboxCommands
+
+    def get_host(self, port: int) -> str: ...
+    async def is_running(self, request_timeout: Optional[float] = None) -> bool: ...
+    async def set_timeout(self, timeout: int) -> Any: ...
+    async def pause(self) -> Any: ...
+    async def kill(self) -> Any: ...
+
+
+def _local_root() -> Path:
+    return Path(settings.local_sandbox_root or Path(tempfile.gettempdir()) / "codeforge-sandboxes")
+
+
+class _LocalFiles:
+    def __init__(self, sbx: "LocalSandbox"):
+        self._sbx = sbx
+
+    async def read(self, path: str, format: str = "text") -> Any:
+        target = self._sbx.host_path(path)
+        if format == "stream":
+            return _LocalFileStream(target.open("rb"))
+        if format == "bytes":
+            return bytearray(target.read_bytes())
+        return target.read_text(encoding="utf-8", errors="replace")
+
+    async def write(self, path: str, data: str) -> str:
+        target = self._sbx.host_path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(data, encoding="utf-8")
+        return path
+
+
+class _LocalFileStream:
+    """Same contract as e2b's AsyncFileStreamReader: async bytes iterator + aclose."""
+
+    def __init__(self, fh):
+        self._fh = fh
+
+    def __aiter__(self) -> "_LocalFileStream":
+        return self
+
+    async def __anext__(self) -> bytes:
+        chunk = self._fh.read(64 * 1024)
+        if not chunk:
+            await self.aclose()
+            raise StopAsyncIteration
+        return chunk
+
+    async def aclose(self) -> None:
+        self._fh.close()
+
+    async def __aenter__(self) -> "_LocalFileStream":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.aclose()
+
+
+class LocalCommandHandle:
+    """Background process; output callbacks fire on the loop as it streams."""
+
+    def __init__(
+        self,
+        sbx: "LocalSandbox",
+        proc: asyncio.subprocess.Process,
+        on_stdout: Optional[OutputHandler],
+        on_stderr: Optional[OutputHandler],
+    ):
+        self.pid = proc.pid
+        self._sbx = sbx
+        self._proc = proc
+        self._stdout: List[str] = []
+        self._stderr: List[str] = []
+        self._pumps = [
+            asyncio.create_task(self._pump(proc.stdout, self._stdout, on_stdout)),
+            asyncio.create_task(self._pump(proc.stderr, self._stderr, on_stderr)),
+        ]
+
+    async def _pump(self, stream, chunks: List[str], callback: Optional[OutputHandler]) -> None:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        while True:
+            data = await stream.read(4096)
+            text = self._sbx.to_remote(decoder.decode(data, final=not data))
+            if text:
+                chunks.append(text)
+                if callback:
+                    result = callback(text)
+                    if asyncio.iscoroutine(result):
+                        await result
+            if not data:
+                return
+
+    async def wait(self) -> CommandResult:
+        await asyncio.gather(*self._pumps)
+        code = await self._proc.wait()
+        stdout, stderr = "".join(self._stdout), "".join(self._stderr)
+        if code != 0:
+            raise CommandExitException(stdout=stdout, stderr=stderr, exit_code=code, error=None)
+        return CommandResult(stdout=stdout, stderr=stderr, exit_code=0, error=None)
+
+    async def kill(self) -> bool:
+        return self._sbx.kill_process(self._proc)
+
+
+class _LocalCommands:
+    def __init__(self, sbx: "LocalSandbox"):
+        self._sbx = sbx
+
+    async def run(
+        self,
+        cmd: str,
+        *,
+        background: bool = False,
+        cwd: Optional[str] = None,
+        envs: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = 60,
+        on_stdout: Optional[OutputHandler] = None,
+        on_stderr: Optional[OutputHandler] = None,
+        **_: Any,
+    ) -> Any:
+        sbx = self._sbx
+        proc = await asyncio.create_subprocess_exec(
+            "bash", "-c", sbx.to_host(cmd),
+            cwd=sbx.host_path(cwd or APP_ROOT),
+            env={**os.environ, "HOME": str(sbx.root), **(envs or {})},
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            # ponytail: own process group so kill() takes npm's children with it
+            start_new_session=True,
+        )
+        sbx.processes.add(proc)
+        if background:
+            sbx.track_group(proc.pid)
+        handle = LocalCommandHandle(sbx, proc, on_stdout, on_stderr)
+        if background:
+            return handle
+        try:
+            return await asyncio.wait_for(handle.wait(), timeout=timeout or None)
+        except asyncio.TimeoutError:
+            sbx.kill_process(proc)
+            raise TimeoutException(f"Command timed out after {timeout}s: {cmd}")
+        finally:
+            if proc.returncode is not None:
+                sbx.processes.discard(proc)
+
+
+class LocalSandbox:
+    """Temp-directory sandbox; /home/user maps to the sandbox root.
+
+    Not isolated: commands run as the API user on the host. Each sandbox gets
+    its own free host port for the dev server, and background process groups
+    are recorded next to the root so any handle (or worker) can stop them.
+    """
+
+    url_scheme = "http"
+
+    def __init__(self, sandbox_id: str, root: Path):
+        self.sandbox_id = sandbox_id
+        self.root = root
+        self.files = _LocalFiles(self)
+        self.commands = _LocalCommands(self)
+        self.processes: set[asyncio.subprocess.Process] = set()
+
+    @classmethod
+    async def create(cls, template: Optional[str] = None, **_: Any) -> "LocalSandbox":
+        sandbox_id = f"local-{uuid.uuid4().hex[:12]}"
+        root = _local_root() / sandbox_id
+        root.mkdir(parents=True)
+        sbx = cls(sandbox_id, root)
+        sbx._sidecar("port").write_text(str(_free_port()))
+        return sbx
+
+    @classmethod
+    async def connect(cls, sandbox_id: str, **_: Any) -> "LocalSandbox":
+        root = _local_root() / sandbox_id
+        if not sandbox_id.startswith("local-") or not root.is_dir():
+            raise FileNotFoundError(f"Local sandbox {sandbox_id} not found")
+        return cls(sandbox_id, root)
+
+    def host_path(self, path: str) -> Path:
+        if path == APP_ROOT or path.startswith(f"{APP_ROOT}/"):
+            return self.root / path[len(APP_ROOT):].lstrip("/")
+        return Path(path)
+
+    def to_host(self, text: str) -> str:
+        return text.replace(APP_ROOT, str(self.root))
+
+    def to_remote(self, text: str) -> str:
+        return text.replace(str(self.root), APP_ROOT)
+
+    def _sidecar(self, kind: str) -> Path:
+        # ponytail: beside the root, not in it — never shows up as a project file
+        return self.root.with_name(f"{self.sandbox_id}.{kind}")
+
+    @property
+    def dev_port(self) -> int:
+        """Host port this sandbox's dev server listens on (the host's :3000 is taken)."""
+        path = self._sidecar("port")
+        try:
+            return int(path.read_text())
+        except (FileNotFoundError, ValueError):
+            port = _free_port()
+            path.write_text(str(port))
+            return port
+
+    def get_host(self, port: int) -> str:
+        return f"localhost:{port}"
+
+    def _groups(self) -> List[int]:
+        try:
+            return [int(pid) for pid in self._sidecar("pgids").read_text().split()]
+        except FileNotFoundError:
+            return []
+
+    def track_group(self, pgid: int) -> None:
+        live = [pid for pid in self._groups() if _group_alive(pid)]
+        self._sidecar("pgids").write_text(" ".join(map(str, live + [pgid])))
+
+    def kill_background(self) -> None:
+        """Stop every background process group this sandbox started, from any handle."""
+        for pgid in self._groups():
+            with suppress(ProcessLookupError, PermissionError):
+                os.killpg(pgid, signal.SIGKILL)
+        self._sidecar("pgids").unlink(missing_ok=True)
+
+    async def is_running(self, request_timeout: Optional[float] = None) -> bool:
+        return self.root.is_dir()
+
+    def _check(self) -> None:
+        if not self.root.is_dir():
+            raise FileNotFoundError(f"Local sandbox {self.sandbox_id} not found")
+
+    async def set_timeout(self, timeout: int) -> None:
+        self._check()
+
+    async def pause(self) -> bool:
+        """No memory snapshot locally: stop the sandbox's processes, keep the files."""
+        self._check()
+        for proc in list(self.processes):
+            self.kill_process(proc)
+        # ponytail: a fresh by-id handle has no processes — the recorded groups are the dev server
+        self.kill_background()
+        return True
+
+    def kill_process(self, proc: asyncio.subprocess.Process) -> bool:
+        self.processes.discard(proc)
+        if proc.returncode is not None:
+            return False
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            return False
+        return True
+
+    async def kill(self) -> bool:
+        for proc in list(self.processes):
+            self.kill_process(proc)
+        self.kill_background()
+        self._sidecar("port").unlink(missing_ok=True)
+        shutil.rmtree(self.root, ignore_errors=True)
+        return True
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _group_alive(pgid: int) -> bool:
+    try:
+        os.killpg(pgid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def backend_class() -> Type[Any]:
+    """Sandbox class selected by settings.sandbox_backend."""
+    return LocalSandbox if settings.sandbox_backend == "local" else AsyncSandbox
+
+
+# By-id lifecycle calls that don't connect (connecting would resume a paused sandbox).
+
+async def pause_sandbox(sandbox_id: str) -> bool:
+    if settings.sandbox_backend == "local":
+        return await (await LocalSandbox.connect(sandbox_id)).pause()
+    return await AsyncSandbox.pause(sandbox_id)
+
+
+async def extend_sandbox(sandbox_id: str, timeout: int) -> None:
+    if settings.sandbox_backend == "local":
+        await (await LocalSandbox.connect(sandbox_id)).set_timeout(timeout)
+    else:
+        await AsyncSandbox.set_timeout(sandbox_id, timeout)
+
+
+async def kill_sandbox(sandbox_id: str) -> None:
+    if settings.sandbox_backend == "local":
+        await (await LocalSandbox.connect(sandbox_id)).kill()
+    else:
+        await AsyncSandbox.kill(sandbox_id)
+
+
+async def list_sandboxes() -> List[Tuple[str, float]]:
+    """(sandbox_id, started_at epoch seconds) for every sandbox this app created."""
+    if settings.sandbox_backend == "local":
+        root = _local_root()
+        return [(p.name, p.stat().st_ctime) for p in root.glob("local-*") if p.is_dir()]
+    paginator = AsyncSandbox.list(query=SandboxQuery(metadata=SANDBOX_METADATA))
+    found: List[Tuple[str, float]] = []
+    while paginator.has_next:
+        found += [(s.sandbox_id, s.started_at.timestamp()) for s in await paginator.next_items()]
+    return found
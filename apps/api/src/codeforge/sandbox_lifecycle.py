@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import asynccontextmanager, suppress
+from typing import AsyncIterator, Dict, Optional, Set, TypeVar
+
+from codeforge import db
+from codeforge.config import settings
+from codeforge.db import SessionLocal
+from codeforge.metrics import SANDBOX_LIFECYCLE
+from codeforge.sandbox import SANDBOX_TIMEOUT_S
+from codeforge.sandbox_backend import SANDBOX_GONE, kill_sandbox, list_sandboxes
+from codeforge.sandbox_pool import sandbox_pool
+from codeforge.shared_state import WORKER_ID, shared_state
+from codeforge.warm_pool import warm_pool
+
+T = TypeVar("T")
+
+
+class SandboxLifecycle:
+    """Background sweep that keeps session sandboxes cheap and sandbox_state true.
+
+    Each sweep, for sessions whose sandbox is "running":
+    - hot (an agent run or an open stream holds the session): reset the
+      sandbox timeout so it never expires mid-use;
+    - touched (e.g. an open preview's heartbeat) within pause_after_s: keep it;
+    - idle for pause_after_s: pause it (the next connect resumes it);
+    - gone: mark it "dead".
+    Sandboxes we created that no session, pool handle or warm slot knows
+    about are killed once older than orphan_grace_s.
+
+    Holds and releases are written to shared state as they happen (the pool
+    does the same for handouts), and every worker refreshes its holds and
+    live handles each tick; only the worker holding the leader lease sweeps.
+    """
+
+    def __init__(self, *, pause_after_s: float, sweep_s: float, orphan_grace_s: float):
+        self.pause_after_s = pause_after_s
+        self.sweep_s = sweep_s
+        self.orphan_grace_s = orphan_grace_s
+        self._holds: Dict[str, int] = {}
+        self._started = time.time()
+        self._task: Optional[asyncio.Task] = None
+
+    @asynccontextmanager
+    async def hold(self, session_id: str) -> AsyncIterator[None]:
+        """Keep the session's sandbox hot while the block runs."""
+        self._holds[session_id] = self._holds.get(session_id, 0) + 1
+        # ponytail: published now, not on the next tick — the leader may be another worker
+        await self._put(f"hot:{session_id}", WORKER_ID, 2 * self.sweep_s)
+        try:
+            yield
+        finally:
+            self._holds[session_id] -= 1
+            if not self._holds[session_id]:
+                del self._holds[session_id]
+            # ponytail: hot: just expires — deleting it could drop another worker's hold
+            await self.touch(session_id)
+
+    async def touch(self, session_id: str) -> None:
+        """Record activity on the session; it stays unpaused for pause_after_s."""
+        await self._put(f"active:{session_id}", str(time.time()), self.pause_after_s + 2 * self.sweep_s)
+
+    async def _put(self, key: str, value: str, ttl_s: float) -> None:
+        # ponytail: best effort — a shared-state blip must not fail the run or stream
+        with suppress(Exception):
+            await shared_state.put(key, value, ttl_s)
+
+    async def held(self, session_id: str, entries: AsyncIterator[T]) -> AsyncIterator[T]:
+        """`entries`, holding the session for as long as the stream is open."""
+        async with self.hold(session_id):
+            async for entry in entries:
+                yield entry
+
+    def start(self) -> None:
+        if self._task is None:
+            self._started = time.time()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_s)
+            # ponytail: one bad sweep (API blip, locked db) must not stop the loop
+            with suppress(Exception):
+                await self._publish()
+                if await shared_state.claim("lifecycle:leader", WORKER_ID, ttl_s=3 * self.sweep_s):
+                    await self.sweep()
+
+    async def _publish(self) -> None:
+        ttl = 2 * self.sweep_s
+        for session_id in self._holds:
+            await shared_state.put(f"hot:{session_id}", WORKER_ID, ttl)
+        for sandbox_id in warm_pool.sandbox_ids() | set(sandbox_pool.sandbox_ids()):
+            await shared_state.put(f"live:{sandbox_id}", WORKER_ID, ttl)
+
+    async def _hot(self, session_id: str) -> bool:
+        return session_id in self._holds or await shared_state.get(f"hot:{session_id}") is not None
+
+    async def _idle_s(self, session_id: str, sandbox_id: str) -> float:
+        last = max(
+            self._started,
+            sandbox_pool.last_used(sandbox_id) or 0.0,
+            float(await shared_state.get(f"active:{session_id}") or 0.0),
+            float(await shared_state.get(f"used:{sandbox_id}") or 0.0),
+        )
+        return time.time() - last
+
+    async def sweep(self) -> None:
+        async with SessionLocal() as session:
+            rows = await db.list_sandbox_sessions(session)
+
+        for session_id, sandbox_id, state in rows:
+            if state != "running":
+                continue
+            try:
+                if await self._hot(session_id):
+                    await sandbox_pool.extend(sandbox_id, SANDBOX_TIMEOUT_S)
+                    SANDBOX_LIFECYCLE.labels(action="extended").inc()
+                    continue
+                if await self._idle_s(session_id, sandbox_id) < self.pause_after_s:
+                    continue
+                await sandbox_pool.pause(sandbox_id)
+                state = "paused"
+            except SANDBOX_GONE:
+                sandbox_pool.discard(sandbox_id)
+                state = "dead"
+            except Exception:
+                continue
+            async with SessionLocal() as session:
+                await db.set_sandbox_state(session, sandbox_id, state)
+            SANDBOX_LIFECYCLE.labels(action=state).inc()
+
+        await self._reap({sid for _, sid, _ in rows})
+
+    async def _reap(self, known: Set[str]) -> None:
+        listed = await list_sandboxes()
+        known |= warm_pool.sandbox_ids() | set(sandbox_pool.sandbox_ids())
+        cutoff = time.time() - self.orphan_grace_s
+        for sandbox_id, started_at in listed:
+            if sandbox_id in known or started_at >= cutoff:
+                continue
+            # ponytail: another worker's warm slot or pooled handle
+            if await shared_state.get(f"live:{sandbox_id}"):
+                continue
+            with suppress(Exception):
+                await kill_sandbox(sandbox_id)
+                SANDBOX_LIFECYCLE.labels(action="reaped").inc()
+
+
+sandbox_lifecycle = SandboxLifecycle(
+    pause_after_s=settings.sandbox_pause_after_s,
+    sweep_s=settings.sandbox_sweep_s,
+    orphan_grace_s=settings.sandbox_orphan_grace_s,
+)
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, suppress
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from codeforge import db
+from codeforge.config import settings
+from codeforge.db import SessionLocal
+from codeforge.file_mirror import file_mirror
+from codeforge.metrics import SANDBOX_CONNECT
+from codeforge.sandbox import E2BSandbox
+from codeforge.sandbox_backend import extend_sandbox, pause_sandbox
+from codeforge.shared_state import shared_state
+from codeforge.warm_pool import warm_pool
+
+
+@dataclass
+class _Entry:
+    handle: E2BSandbox
+    last_used: float
+    last_checked: float
+
+
+class SandboxPool:
+    """Live E2BSandbox handles keyed by sandbox id (LRU + idle TTL).
+
+    Agent runs and HTTP endpoints share one handle per sandbox, so dev-server
+    state (dev_log, dev_handle) survives across requests. A pinned handle
+    (one an agent run is using) is never evicted, however long the run.
+    """
+
+    def __init__(self, *, max_size: int, ttl_s: float, liveness_s: float):
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self.liveness_s = liveness_s
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._pins: Dict[str, int] = {}
+        # ponytail: outlives handle eviction — the lifecycle manager reads it for idleness
+        self._handed_out: Dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lock(self, sandbox_id: str) -> asyncio.Lock:
+        if sandbox_id not in self._locks:
+            self._locks[sandbox_id] = asyncio.Lock()
+        return self._locks[sandbox_id]
+
+    def _evict(self, now: float) -> None:
+        unpinned = [sid for sid in self._entries if sid not in self._pins]
+        for sid in unpinned:
+            if now - self._entries[sid].last_used > self.ttl_s:
+                self.discard(sid)
+        # ponytail: LRU order; may stay over max_size while everything left is pinned
+        for sid in [sid for sid in unpinned if sid in self._entries][: len(self._entries) - self.max_size]:
+            self.discard(sid)
+
+    @contextmanager
+    def pinned(self, sandbox_id: str) -> Iterator[None]:
+        """Keep the sandbox's handle pooled while the block runs."""
+        self._pins[sandbox_id] = self._pins.get(sandbox_id, 0) + 1
+        try:
+            yield
+        finally:
+            self._pins[sandbox_id] -= 1
+            if not self._pins[sandbox_id]:
+                del self._pins[sandbox_id]
+            entry = self._entries.get(sandbox_id)
+            if entry:
+                # ponytail: the idle TTL starts when the run lets go, not when it connected
+                entry.last_used = time.monotonic()
+
+    def _put(self, sandbox_id: str, handle: E2BSandbox) -> None:
+        handle.load_project_dir = functools.partial(self._load_project_dir, sandbox_id)
+        handle.on_project_dir = functools.partial(self._save_project_dir, sandbox_id)
+        now = time.monotonic()
+        self._entries[sandbox_id] = _Entry(handle=handle, last_used=now, last_checked=now)
+        self._entries.move_to_end(sandbox_id)
+        self._evict(now)
+
+    async def _alive(self, entry: _Entry) -> bool:
+        now = time.monotonic()
+        # ponytail: skip the health round-trip for handles used moments ago
+        if now - entry.last_checked < self.liveness_s:
+            return True
+        if await entry.handle.is_alive():
+            entry.last_checked = now
+            return True
+        return False
+
+    def sandbox_ids(self) -> List[str]:
+        return list(self._entries)
+
+    def last_used(self, sandbox_id: str) -> Optional[float]:
+        """Wall-clock time the sandbox was last handed out by this pool."""
+        return self._handed_out.get(sandbox_id)
+
+    def discard(self, sandbox_id: str) -> None:
+        self._entries.pop(sandbox_id, None)
+        self._handed_out.pop(sandbox_id, None)
+        file_mirror.invalidate(sandbox_id)
+        lock = self._locks.get(sandbox_id)
+        if lock and not lock.locked():
+            del self._locks[sandbox_id]
+
+    async def pause(self, sandbox_id: str) -> None:
+        """Pause the sandbox and drop its handle; the next connect resumes it."""
+        async with self._lock(sandbox_id):
+            entry = self._entries.get(sandbox_id)
+            if entry:
+                await entry.handle.sandbox.pause()
+            else:
+                await pause_sandbox(sandbox_id)
+            self.discard(sandbox_id)
+
+    async def extend(self, sandbox_id: str, timeout: int) -> None:
+        entry = self._entries.get(sandbox_id)
+        if entry:
+            await entry.handle.sandbox.set_timeout(timeout)
+        else:
+            await extend_sandbox(sandbox_id, timeout)
+
+    async def _mark_used(self, sandbox_id: str) -> None:
+        now = time.time()
+        self._handed_out[sandbox_id] = now
+        # ponytail: published at handout — the lifecycle leader may be another worker
+        with suppress(Exception):
+            await shared_state.put(
+                f"used:{sandbox_id}", str(now),
+                settings.sandbox_pause_after_s + 2 * settings.sandbox_sweep_s,
+            )
+
+    async def _load_project_dir(self, sandbox_id: str) -> Optional[str]:
+        async with SessionLocal() as session:
+            return await db.get_project_dir(session, sandbox_id)
+
+    async def _save_project_dir(self, sandbox_id: str, project_dir: Optional[str]) -> None:
+        async with SessionLocal() as session:
+            await db.set_project_dir(session, sandbox_id, project_dir)
+
+    async def _set_state(self, sandbox_id: str, state: str) -> bool:
+        async with SessionLocal() as session:
+            return await db.set_sandbox_state(session, sandbox_id, state)
+
+    async def _create(
+        self,
+        template: str,
+        on_created: Optional[Callable[[str], Union[asyncio.Future, object]]],
+    ) -> Tuple[E2BSandbox, str, str]:
+        handle = await warm_pool.claim(template)
+        outcome = "warm" if handle else "created"
+        if handle is None:
+            handle = await E2BSandbox.create(template)
+        sid = handle.sandbox.sandbox_id
+        self._put(sid, handle)
+        if on_created:
+            result = on_created(sid)
+            if asyncio.iscoroutine(result):
+                await result
+        return handle, sid, outcome
+
+    async def connect_or_create(
+        self,
+        sandbox_id: Optional[str],
+        template: str,
+        on_created: Optional[Callable[[str], Union[asyncio.Future, object]]] = None,
+    ) -> Tuple[E2BSandbox, str]:
+        started = time.monotonic()
+        if not sandbox_id:
+            handle, sid, outcome = await self._create(template, on_created)
+            SANDBOX_CONNECT.labels(outcome=outcome).observe(time.monotonic() - started)
+            await self._mark_used(sid)
+            return handle, sid
+
+        async with self._lock(sandbox_id):
+            entry = self._entries.get(sandbox_id)
+            if entry:
+                if await self._alive(entry):
+                    entry.last_used = time.monotonic()
+                    self._entries.move_to_end(sandbox_id)
+                    SANDBOX_CONNECT.labels(outcome="reused").observe(time.monotonic() - started)
+                    await self._mark_used(sandbox_id)
+                    return entry.handle, sandbox_id
+                self._entries.pop(sandbox_id, None)
+
+            try:
+                # ponytail: connecting a paused sandbox resumes it
+                connected: Optional[E2BSandbox] = await E2BSandbox.connect(sandbox_id)
+            except Exception:
+                connected = None
+            if connected:
+                handle, sid = connected, sandbox_id
+                self._put(sid, handle)
+                outcome = "resumed" if await self._set_state(sid, "running") else "connected"
+            else:
+                await self._set_state(sandbox_id, "dead")
+                handle, sid, outcome = await self._create(template, on_created)
+
+        SANDBOX_CONNECT.labels(outcome=outcome).observe(time.monotonic() - started)
+        await self._mark_used(sid)
+        if sid != sandbox_id:
+            self.discard(sandbox_id)
+        return handle, sid
+
+
+sandbox_pool = SandboxPool(
+    max_size=settings.sandbox_pool_size,
+    ttl_s=settings.sandbox_pool_ttl_s,
+    liveness_s=settings.sandbox_liveness_s,
+)
@@ -48,6 +48,7 @@ class GetSessionResponse(BaseModel):
     sandbox_id: Optional[str]
     sandbox_state: Literal["running", "paused", "dead"]
     messages: List[SessionMessage]
+    before_cursor: Optional[str] = None
     preview_url: Optional[str] = None
     needs_run: bool = False
     agent_running: bool = False
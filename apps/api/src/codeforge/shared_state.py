@@ -0,0 +1,163 @@
+"""State shared by every API worker: run leases, abort signals, locks, session values.
+
+`SharedState` is the interface; `SqliteSharedState` keeps expiring key/value
+entries in one SQLite file that all workers on a host open. The file must be
+on a local disk (SQLite's WAL doesn't work over network filesystems); to span
+several nodes, plug in another implementation of the protocol. Every entry
+carries an expiry, so a crashed worker's leases and stale values age out
+instead of piling up.
+
+Still per process: live sandbox handles (SandboxPool), dev-server logs, run
+event replay (SSE re-attach needs sticky routing), the run scheduler's caps
+and the file mirror's contents. The mirror stays correct across workers
+because every entry is checked against the `mirror:<sandbox>` epoch kept
+here before it is served.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import socket
+import time
+import uuid
+from contextlib import asynccontextmanager, suppress
+from pathlib import Path
+from typing import AsyncIterator, Optional, Protocol
+
+import aiosqlite
+
+from codeforge.config import settings
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+LOCK_TTL_S = 60
+LOCK_POLL_S = 0.25
+PURGE_EVERY_S = 60
+
+
+class SharedState(Protocol):
+    async def get(self, key: str) -> Optional[str]: ...
+    async def put(self, key: str, value: str, ttl_s: float) -> None: ...
+    async def claim(self, key: str, value: str, ttl_s: float) -> bool:
+        """Set key if it is free, expired or already holds `value` (renewal)."""
+        ...
+    async def delete(self, key: str, value: Optional[str] = None) -> None:
+        """Delete key; with `value`, only while it still holds that value."""
+        ...
+    async def close(self) -> None: ...
+
+
+class SqliteSharedState:
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._opening = asyncio.Lock()
+        self._purged = 0.0
+
+    async def _db(self) -> aiosqlite.Connection:
+        if self._conn is None:
+            async with self._opening:
+                if self._conn is None:
+                    Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+                    # ponytail: autocommit — every operation is one atomic statement
+                    conn = await aiosqlite.connect(self.path, isolation_level=None)
+                    await conn.execute("PRAGMA journal_mode=WAL")
+                    await conn.execute(f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}")
+                    await conn.execute(
+                        "CREATE TABLE IF NOT EXISTS entries "
+                        "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+                    )
+                    self._conn = conn
+        return self._conn
+
+    async def _purge(self, conn: aiosqlite.Connection, now: float) -> None:
+        if now - self._purged > PURGE_EVERY_S:
+            self._purged = now
+            await conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+
+    async def get(self, key: str) -> Optional[str]:
+        conn = await self._db()
+        async with conn.execute(
+            "SELECT value FROM entries WHERE key = ? AND expires_at > ?", (key, time.time()),
+        ) as cur:
+            row = await cur.fetchone()
+        return row[0] if row else None
+
+    async def put(self, key: str, value: str, ttl_s: float) -> None:
+        conn, now = await self._db(), time.time()
+        await conn.execute(
+            "INSERT INTO entries (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, value, now + ttl_s),
+        )
+        await self._purge(conn, now)
+
+    async def claim(self, key: str, value: str, ttl_s: float) -> bool:
+        conn, now = await self._db(), time.time()
+        cur = await conn.execute(
+            "INSERT INTO entries (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+            "WHERE entries.expires_at <= ? OR entries.value = excluded.value",
+            (key, value, now + ttl_s, now),
+        )
+        claimed = cur.rowcount > 0
+        await cur.close()
+        await self._purge(conn, now)
+        return claimed
+
+    async def delete(self, key: str, value: Optional[str] = None) -> None:
+        conn = await self._db()
+        if value is None:
+            await conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        else:
+            await conn.execute("DELETE FROM entries WHERE key = ? AND value = ?", (key, value))
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+
+shared_state: SharedState = SqliteSharedState(settings.shared_state_path)
+
+
+class Lease:
+    """A claimed key, renewed every ttl/3 until released."""
+
+    def __init__(self, key: str, token: str, ttl_s: float):
+        self.key = key
+        self.token = token
+        self.ttl_s = ttl_s
+        self._renew = asyncio.create_task(self._keepalive())
+
+    async def _keepalive(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl_s / 3)
+            with suppress(Exception):
+                await shared_state.claim(self.key, self.token, self.ttl_s)
+
+    async def release(self) -> None:
+        self._renew.cancel()
+        with suppress(Exception):
+            await shared_state.delete(self.key, self.token)
+
+
+async def acquire(key: str, ttl_s: float = LOCK_TTL_S, *, wait_s: Optional[float] = 0) -> Optional[Lease]:
+    """Lease on `key`; polls up to wait_s (None: forever), else returns None."""
+    token = f"{WORKER_ID}:{uuid.uuid4().hex[:12]}"
+    deadline = None if wait_s is None else time.monotonic() + wait_s
+    while not await shared_state.claim(key, token, ttl_s):
+        if deadline is not None and time.monotonic() >= deadline:
+            return None
+        await asyncio.sleep(LOCK_POLL_S)
+    return Lease(key, token, ttl_s)
+
+
+@asynccontextmanager
+async def locked(key: str, ttl_s: float = LOCK_TTL_S) -> AsyncIterator[Lease]:
+    """Cross-process mutex on `key`; a holder that dies releases it after ttl_s."""
+    lease = await acquire(key, ttl_s, wait_s=None)
+    assert lease is not None
+    try:
+        yield lease
+    finally:
+        await lease.release()
@@ -0,0 +1,67 @@
+"""Write-time materialization of UI transcript turns.
+
+Raw message rows stay the source of truth for agent history; `ui_turns`
+holds the interleaved text/tool blocks the chat UI renders, computed once
+when rows are persisted so session reads never re-parse tool output.
+"""
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+from typing import Any, List
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from codeforge import db
+from codeforge.agent.messages import rows_to_ui_messages
+from codeforge.db import MessageRow, SessionLocal
+from codeforge.write_queue import write_queue
+
+
+def _ui_turns(rows: List[MessageRow]) -> List[dict[str, Any]]:
+    turns = rows_to_ui_messages(rows)
+    for t in turns:
+        t["created_at"] = datetime.fromisoformat(t["created_at"])
+    return turns
+
+
+async def add_user_message(session_id: str, content: Any) -> MessageRow:
+    rows = db.new_message_rows(session_id, [{"role": "user", "content": content}])
+    await write_queue.submit([*rows, *db.new_ui_turn_rows(session_id, _ui_turns(rows))])
+    return rows[0]
+
+
+async def add_run_rows(session_id: str, rows: List[dict[str, Any]]) -> None:
+    """Persist a run's rows and its UI turn in one queued transaction."""
+    if not rows:
+        return
+    saved = db.new_message_rows(session_id, rows)
+    await write_queue.submit([*saved, *db.new_ui_turn_rows(session_id, _ui_turns(saved))])
+
+
+async def ensure_ui_turns(session: AsyncSession, session_id: str) -> bool:
+    """Backfill ui_turns for a session persisted before materialization."""
+    if await db.has_ui_turns(session, session_id):
+        return False
+    rows = await db.list_messages(session, session_id)
+    if not rows:
+        return False
+    try:
+        await db.add_ui_turns(session, session_id, _ui_turns(rows))
+    except IntegrityError:
+        # ponytail: a concurrent read backfilled the same turns (ids come from the rows)
+        await session.rollback()
+        return False
+    return True
+
+
+async def backfill_all() -> int:
+    await db.init_db()
+    async with SessionLocal() as session:
+        ids = await db.list_session_ids(session)
+        return sum([await ensure_ui_turns(session, sid) for sid in ids])
+
+
+if __name__ == "__main__":
+    print(f"backfilled {asyncio.run(backfill_all())} sessions")
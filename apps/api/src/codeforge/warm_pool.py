@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from contextlib import suppress
+from dataclasses import dataclass
+from typing import Deque, Optional, Set
+
+from codeforge.config import settings
+from codeforge.metrics import WARM_POOL_CLAIMS, WARM_POOL_READY
+from codeforge.sandbox import SANDBOX_TIMEOUT_S, E2BSandbox
+from codeforge.sandbox_backend import APP_ROOT
+
+PROVISION_TIMEOUT_S = 10 * 60
+RETRY_S = 30
+
+
+@dataclass
+class _Warm:
+    handle: E2BSandbox
+    created: float
+
+
+class WarmSandboxPool:
+    """Pre-created sandboxes for sessions that don't have one yet.
+
+    A background task keeps `size` sandboxes of `template` ready (running the
+    optional provision command in each first). claim() hands out the newest
+    and resets its timeout; sandboxes older than max_age_s are killed instead,
+    so a claimed one never arrives with its e2b timeout nearly spent.
+    """
+
+    def __init__(self, *, size: int, max_age_s: float, template: str, provision: str = ""):
+        self.size = size
+        self.max_age_s = max_age_s
+        self.template = template
+        self.provision = provision
+        self._ready: Deque[_Warm] = deque()
+        self._claiming: Set[str] = set()
+        # ponytail: strong refs — the loop only keeps weak ones to fire-and-forget tasks
+        self._killing: Set[asyncio.Task] = set()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        WARM_POOL_READY.set_function(lambda: len(self._ready))
+
+    def __len__(self) -> int:
+        return len(self._ready)
+
+    def sandbox_ids(self) -> Set[str]:
+        return {w.handle.sandbox.sandbox_id for w in self._ready} | self._claiming
+
+    def start(self) -> None:
+        if self.size > 0 and self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._refill())
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        while self._ready:
+            await self._kill(self._ready.popleft().handle)
+        if self._killing:
+            await asyncio.gather(*self._killing)
+
+    async def claim(self, template: str) -> Optional[E2BSandbox]:
+        if self.size <= 0 or template != self.template:
+            return None
+        self._prune()
+        while self._ready:
+            warm = self._ready.pop()
+            self._wake.set()
+            sid = warm.handle.sandbox.sandbox_id
+            self._claiming.add(sid)
+            try:
+                # ponytail: doubles as the liveness check — a dead sandbox raises here
+                await warm.handle.sandbox.set_timeout(SANDBOX_TIMEOUT_S)
+            except Exception:
+                self._kill_later(warm.handle)
+                continue
+            finally:
+                self._claiming.discard(sid)
+            WARM_POOL_CLAIMS.labels(outcome="hit").inc()
+            return warm.handle
+        WARM_POOL_CLAIMS.labels(outcome="miss").inc()
+        return None
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - self.max_age_s
+        while self._ready and self._ready[0].created < cutoff:
+            self._kill_later(self._ready.popleft().handle)
+
+    async def _refill(self) -> None:
+        while True:
+            self._wake.clear()
+            self._prune()
+            missing = self.size - len(self._ready)
+            results = await asyncio.gather(*(self._create() for _ in range(missing)))
+            self._ready.extend(w for w in results if w)
+            if not all(results):
+                timeout: Optional[float] = RETRY_S
+            elif self._ready:
+                timeout = max(self._ready[0].created + self.max_age_s - time.monotonic(), 0)
+            else:
+                timeout = None
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+
+    async def _create(self) -> Optional[_Warm]:
+        created = time.monotonic()
+        try:
+            handle = await E2BSandbox.create(self.template)
+        except Exception:
+            return None
+        if self.provision:
+            try:
+                await handle.sandbox.commands.run(self.provision, cwd=APP_ROOT, timeout=PROVISION_TIMEOUT_S)
+            except Exception:
+                await self._kill(handle)
+                return None
+        return _Warm(handle=handle, created=created)
+
+    def _kill_later(self, handle: E2BSandbox) -> None:
+        task = asyncio.create_task(self._kill(handle))
+        self._killing.add(task)
+        task.add_done_callback(self._killing.discard)
+
+    async def _kill(self, handle: E2BSandbox) -> None:
+        with suppress(Exception):
+            await handle.sandbox.kill()
+
+
+warm_pool = WarmSandboxPool(
+    size=settings.warm_pool_size,
+    max_age_s=settings.warm_pool_max_age_s,
+    template=settings.e2b_template,
+    provision=settings.warm_pool_provision,
+)
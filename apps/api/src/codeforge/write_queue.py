@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import asyncio
+from typing import List, Optional, Sequence, Tuple
+
+from codeforge import db
+from codeforge.db import Base, SessionLocal
+
+MAX_BATCH_JOBS = 64
+
+_Job = Tuple[Sequence[Base], asyncio.Future]
+
+
+class WriteBehindQueue:
+    """Single background writer for transcript rows.
+
+    Jobs queued by concurrent sessions are committed together in one SQLite
+    transaction, so persisting a run never serializes other sessions'
+    event streams behind per-row commits.
+    """
+
+    def __init__(self, max_batch: int = MAX_BATCH_JOBS):
+        self.max_batch = max_batch
+        self._queue: "asyncio.Queue[Optional[_Job]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            # ponytail: queue binds to the running loop — recreate with the worker
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task and not self._task.done():
+            self._queue.put_nowait(None)
+            await self._task
+        self._task = None
+
+    def submit(self, rows: Sequence[Base]) -> asyncio.Future:
+        """Queue rows for insert; the future resolves once they are committed."""
+        self.start()
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((rows, fut))
+        return fut
+
+    async def _run(self) -> None:
+        while True:
+            job = await self._queue.get()
+            if job is None:
+                return
+            jobs: List[_Job] = [job]
+            stop = False
+            while len(jobs) < self.max_batch and not self._queue.empty():
+                nxt = self._queue.get_nowait()
+                if nxt is None:
+                    stop = True
+                    break
+                jobs.append(nxt)
+            await self._flush(jobs)
+            if stop:
+                return
+
+    async def _flush(self, jobs: List[_Job]) -> None:
+        try:
+            async with SessionLocal() as session:
+                await db.add_all(session, [row for rows, _ in jobs for row in rows])
+        except Exception:
+            # ponytail: one bad job must not fail the batch — retry each alone
+            for rows, fut in jobs:
+                try:
+                    async with SessionLocal() as session:
+                        await db.add_all(session, rows)
+                    _resolve(fut)
+                except Exception as e:
+                    if not fut.done():
+                        fut.set_exception(e)
+            return
+        for _, fut in jobs:
+            _resolve(fut)
+
+
+def _resolve(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+
+write_queue = WriteBehindQueue()
@@ -4,6 +4,7 @@ import { useCallback, useEffect, useRef, useState } from "react";
 import { use } from "react";
 import {
   abortSession,
+  attachEvents,
   getSession,
   listSessionFiles,
   sendMessage,
@@ -34,6 +35,12 @@ function formatMessages(
   }));
 }
 
+/** Swap in a fresh newest page, keeping older pages loaded above it. */
+function mergeNewest(prev: ChatMessage[], page: ChatMessage[]): ChatMessage[] {
+  const at = page.length ? prev.findIndex((m) => m.id === page[0].id) : -1;
+  return at > 0 ? [...prev.slice(0, at), ...page] : page;
+}
+
 function normalizeFilePath(path: string): string {
   return path
     .replace(/^\/home\/user\//, "")
@@ -62,6 +69,9 @@ export default function ChatPage({
   const [previewUrl, setPreviewUrl] = useState<string | null>(null);
   const [filePaths, setFilePaths] = useState<string[]>([]);
   const [sessionTitle, setSessionTitle] = useState<string>("Session");
+  const [olderCursor, setOlderCursor] = useState<string | null>(null);
+  const [loadingOlder, setLoadingOlder] = useState(false);
+  const olderLoadedRef = useRef(false);
   const genRef = useRef(0);
   const textBufferRef = useRef("");
   const flushTimerRef = useRef<ReturnType<typeof setTimeout> | null>(null);
@@ -113,6 +123,10 @@ export default function ChatPage({
           setStatus(event.message);
           break;
 
+        case "queued":
+          setStatus(`Queued — position ${event.position}`);
+          break;
+
         case "text":
           setStatus(null);
           textBufferRef.current += event.delta;
@@ -178,13 +192,36 @@ export default function ChatPage({
       const s = await getSession(sessionId);
       if (gen !== genRef.current) return s;
       setSessionTitle(s.title);
-      setMessages(formatMessages(s.messages));
+      const page = formatMessages(s.messages);
+      if (olderLoadedRef.current) {
+        setMessages((prev) => mergeNewest(prev, page));
+      } else {
+        setMessages(page);
+        setOlderCursor(s.before_cursor);
+      }
       await refreshFiles();
       return s;
     },
     [sessionId, refreshFiles],
   );
 
+  const loadOlder = useCallback(async () => {
+    if (!olderCursor || loadingOlder) return;
+    const gen = genRef.current;
+    setLoadingOlder(true);
+    try {
+      const s = await getSession(sessionId, olderCursor);
+      if (gen !== genRef.current) return;
+      olderLoadedRef.current = true;
+      setMessages((prev) => [...formatMessages(s.messages), ...prev]);
+      setOlderCursor(s.before_cursor);
+    } catch {
+      /* keep the cursor; the control stays for a retry */
+    } finally {
+      setLoadingOlder(false);
+    }
+  }, [sessionId, olderCursor, loadingOlder]);
+
   const pollUntilDone = useCallback(
     async (gen: number) => {
       while (gen === genRef.current) {
@@ -196,6 +233,20 @@ export default function ChatPage({
     [refreshFromServer],
   );
 
+  /** Re-attach to a run started elsewhere (reload, second tab) instead of polling. */
+  const followRun = useCallback(
+    async (gen: number) => {
+      const result = await attachEvents(sessionId, makeEventHandler(gen));
+      if (result === "no_run") {
+        await pollUntilDone(gen);
+      } else if (gen === genRef.current) {
+        flushText(gen);
+        await refreshFromServer(gen);
+      }
+    },
+    [sessionId, makeEventHandler, pollUntilDone, refreshFromServer, flushText],
+  );
+
   const runStream = useCallback(
     async (gen: number, mode: "run" | "message", content?: string) => {
       setLoading(true);
@@ -210,7 +261,7 @@ export default function ChatPage({
 
         if (result === "already_running") {
           setStatus("Agent running...");
-          await pollUntilDone(gen);
+          await followRun(gen);
         }
         // ponytail: blocks persisted in DB via assistant+tool rows; live stream still uses block helpers
       } catch (e) {
@@ -232,7 +283,7 @@ export default function ChatPage({
         }
       }
     },
-    [sessionId, makeEventHandler, pollUntilDone, flushText],
+    [sessionId, makeEventHandler, followRun, flushText],
   );
 
   useEffect(() => {
@@ -245,7 +296,9 @@ export default function ChatPage({
 
         setSessionTitle(s.title);
         const restored = formatMessages(s.messages);
+        olderLoadedRef.current = false;
         setMessages(restored);
+        setOlderCursor(s.before_cursor);
         await refreshFiles();
 
         if (s.needs_run) {
@@ -253,7 +306,7 @@ export default function ChatPage({
         } else if (s.agent_running) {
           setLoading(true);
           setStatus("Agent running...");
-          await pollUntilDone(gen);
+          await followRun(gen);
           if (gen === genRef.current) {
             setLoading(false);
             setStatus(null);
@@ -269,7 +322,7 @@ export default function ChatPage({
     return () => {
       genRef.current++;
     };
-  }, [sessionId, runStream, pollUntilDone, refreshFiles]);
+  }, [sessionId, runStream, followRun, refreshFiles]);
 
   useEffect(() => {
     if (!loading) return;
@@ -303,6 +356,9 @@ export default function ChatPage({
               loading={loading}
               status={status}
               sessionTitle={sessionTitle}
+              hasOlder={olderCursor !== null}
+              loadingOlder={loadingOlder}
+              onLoadOlder={() => void loadOlder()}
               onSendMessage={handleSendMessage}
               onAbort={handleAbort}
             />
@@ -17,6 +17,9 @@ interface ChatPanelProps {
   loading: boolean;
   status?: string | null;
   sessionTitle?: string;
+  hasOlder?: boolean;
+  loadingOlder?: boolean;
+  onLoadOlder?: () => void;
   onSendMessage: (content: string) => void;
   onAbort?: () => void;
 }
@@ -48,15 +51,20 @@ export function ChatPanel({
   loading,
   status,
   sessionTitle,
+  hasOlder,
+  loadingOlder,
+  onLoadOlder,
   onSendMessage,
   onAbort,
 }: ChatPanelProps) {
   const [input, setInput] = useState("");
   const bottomRef = useRef<HTMLDivElement>(null);
+  // ponytail: follow the tail only — prepending an older page must not jump to the bottom
+  const lastMessage = messages[messages.length - 1];
 
   useEffect(() => {
     bottomRef.current?.scrollIntoView({ behavior: "smooth", block: "end" });
-  }, [messages, loading, status]);
+  }, [lastMessage, loading, status]);
 
   const handleSubmit = () => {
     if (!input.trim() || loading) return;
@@ -99,6 +107,19 @@ export function ChatPanel({
 
       <ScrollArea className="relative z-10 min-h-0 flex-1">
         <div className="mx-auto max-w-3xl space-y-8 px-6 py-8 pb-4">
+          {hasOlder && onLoadOlder && (
+            <div className="flex justify-center">
+              <Button
+                variant="outline"
+                size="sm"
+                onClick={onLoadOlder}
+                disabled={loadingOlder}
+                className="h-8 border-[#e5e0d8] text-xs text-[#8a8278]"
+              >
+                {loadingOlder ? "Loading..." : "Load older messages"}
+              </Button>
+            </div>
+          )}
           {messages.map((message) =>
             message.role === "user" ? (
               <div
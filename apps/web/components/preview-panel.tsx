@@ -2,7 +2,7 @@
 
 import { useCallback, useEffect, useRef, useState } from "react";
 import dynamic from "next/dynamic";
-import { ensurePreview, fetchFile } from "@/lib/api";
+import { ensurePreview, fetchFile, previewHeartbeat } from "@/lib/api";
 import { Tabs, TabsContent, TabsList, TabsTrigger } from "@/components/ui/tabs";
 import { ScrollArea } from "@/components/ui/scroll-area";
 import {
@@ -25,6 +25,9 @@ import {
 } from "lucide-react";
 import { Terminal } from "@/components/terminal";
 
+// ponytail: well under the API's idle-pause threshold (SANDBOX_PAUSE_AFTER_S, 10 min)
+const PREVIEW_HEARTBEAT_MS = 60_000;
+
 const MonacoEditor = dynamic(() => import("@monaco-editor/react"), {
   ssr: false,
   loading: () => (
@@ -188,6 +191,15 @@ export function PreviewPanel({
     ensureRef.current = null;
   }, [sessionId]);
 
+  useEffect(() => {
+    if (activeTab !== "demo" || !previewUrl) return;
+    // ponytail: iframe traffic goes straight to the sandbox — tell the API the preview is in use
+    const beat = () => void previewHeartbeat(sessionId).catch(() => {});
+    beat();
+    const id = setInterval(beat, PREVIEW_HEARTBEAT_MS);
+    return () => clearInterval(id);
+  }, [activeTab, previewUrl, sessionId]);
+
   const tree = buildFileTree(filePaths);
 
   const FileTreeNode = ({ node, depth = 0 }: { node: FileNode; depth?: number }) => {
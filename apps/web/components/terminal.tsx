@@ -2,14 +2,16 @@
 
 import { useState, useRef, useEffect } from "react";
 import { Loader2 } from "lucide-react";
-import { runTerminal } from "@/lib/api";
+import { followDevLogs, runTerminal } from "@/lib/api";
+
+const MAX_LINES = 2000;
 
 interface TerminalProps {
   sessionId: string | null;
 }
 
 interface TerminalLine {
-  type: "input" | "output" | "error";
+  type: "input" | "output" | "error" | "dev";
   content: string;
 }
 
@@ -25,6 +27,22 @@ export function Terminal({ sessionId }: TerminalProps) {
   const [executing, setExecuting] = useState(false);
   const scrollRef = useRef<HTMLDivElement>(null);
 
+  useEffect(() => {
+    if (!sessionId) return;
+    return followDevLogs(sessionId, (event) => {
+      const added: TerminalLine[] =
+        event.type === "reset"
+          ? [{ type: "dev", content: "— dev server restarted —" }]
+          : [
+              ...(event.dropped
+                ? [{ type: "dev" as const, content: `… ${event.dropped} lines skipped` }]
+                : []),
+              ...event.lines.map((content) => ({ type: "dev" as const, content })),
+            ];
+      if (added.length) setLines((prev) => [...prev, ...added].slice(-MAX_LINES));
+    });
+  }, [sessionId]);
+
   useEffect(() => {
     if (scrollRef.current) {
       scrollRef.current.scrollTop = scrollRef.current.scrollHeight;
@@ -81,7 +99,9 @@ export function Terminal({ sessionId }: TerminalProps) {
                 ? "text-green-600"
                 : line.type === "error"
                   ? "text-red-600"
-                  : "text-gray-800"
+                  : line.type === "dev"
+                    ? "text-[#8a8278]"
+                    : "text-gray-800"
             } whitespace-pre-wrap break-words`}
           >
             {line.content}
@@ -18,6 +18,7 @@ const TOOL_LABELS: Record<string, (input: unknown) => string> = {
   write_file: (i) => `Created ${(i as { path?: string }).path ?? "file"}`,
   edit_file: (i) => `Edited ${(i as { path?: string }).path ?? "file"}`,
   read_file: (i) => `Read ${(i as { path?: string }).path ?? "file"}`,
+  batch_files: (i) => `Batched ${(i as { ops?: unknown[] }).ops?.length ?? 0} file ops`,
   list_files: () => "Listed project files",
   run_command: (i) => `Ran ${(i as { command?: string }).command ?? "command"}`,
   start_dev_server: () => "Started dev server",
@@ -1,4 +1,4 @@
-import type { AgentEvent, GetSessionResponse } from "./types";
+import type { AgentEvent, DevLogEvent, GetSessionResponse } from "./types";
 
 const API_BASE =
   process.env.NEXT_PUBLIC_API_URL ?? "http://localhost:8000";
@@ -25,8 +25,13 @@ export async function listSessions(): Promise<
   return data.sessions ?? [];
 }
 
-export async function getSession(id: string): Promise<GetSessionResponse> {
-  const res = await fetch(`${API_BASE}/api/sessions/${id}`);
+/** Newest turns first; pass `before_cursor` from a previous page for older turns. */
+export async function getSession(
+  id: string,
+  before?: string | null,
+): Promise<GetSessionResponse> {
+  const query = before ? `?before=${encodeURIComponent(before)}` : "";
+  const res = await fetch(`${API_BASE}/api/sessions/${id}${query}`);
   if (!res.ok) throw new Error(`Failed to get session: ${res.statusText}`);
   return res.json();
 }
@@ -53,6 +58,25 @@ export async function fetchFile(
   return res.text();
 }
 
+/**
+ * Tail dev-server output. EventSource resends Last-Event-ID on reconnect,
+ * so a dropped connection resumes without repeating the backlog.
+ */
+export function followDevLogs(
+  sessionId: string,
+  onEvent: (event: DevLogEvent) => void,
+): () => void {
+  const source = new EventSource(`${API_BASE}/api/sessions/${sessionId}/dev-logs`);
+  source.onmessage = (msg) => {
+    try {
+      onEvent(JSON.parse(msg.data) as DevLogEvent);
+    } catch {
+      // ignore malformed frames
+    }
+  };
+  return () => source.close();
+}
+
 export async function ensurePreview(
   sessionId: string,
 ): Promise<{ preview_url: string | null; status: string; output?: string | null }> {
@@ -61,6 +85,10 @@ export async function ensurePreview(
   return res.json();
 }
 
+export async function previewHeartbeat(sessionId: string): Promise<void> {
+  await fetch(`${API_BASE}/api/sessions/${sessionId}/preview/heartbeat`, { method: "POST" });
+}
+
 export async function runTerminal(
   sessionId: string,
   command: string,
@@ -74,61 +102,110 @@ export async function runTerminal(
   return res.json();
 }
 
-function parseSseChunk(raw: string): AgentEvent | null {
+interface SseFrame {
+  id: number | null;
+  event: AgentEvent | null;
+}
+
+function parseSseChunk(raw: string): SseFrame {
+  const frame: SseFrame = { id: null, event: null };
   const normalized = raw.replace(/\r/g, "");
   for (const line of normalized.split("\n")) {
+    if (line.startsWith("id:")) {
+      const id = Number(line.slice(3).trim());
+      if (Number.isFinite(id)) frame.id = id;
+      continue;
+    }
     if (!line.startsWith("data:")) continue;
     const payload = line.slice(5).trim();
-    if (!payload || payload === "[DONE]") return null;
+    if (!payload || payload === "[DONE]") continue;
     try {
-      return JSON.parse(payload) as AgentEvent;
+      frame.event = JSON.parse(payload) as AgentEvent;
     } catch {
-      return null;
+      /* ignore malformed frame */
     }
   }
-  return null;
+  return frame;
+}
+
+const MAX_RESUMES = 3;
+
+function eventsUrl(sessionId: string): string {
+  return `${API_BASE}/api/sessions/${sessionId}/events`;
 }
 
+/**
+ * Stream SSE events. If the connection drops before `done`/`error`, re-attach
+ * to the run's event log with Last-Event-ID so only missed events replay.
+ */
 async function consumeSse(
+  sessionId: string,
   url: string,
   init: RequestInit,
   onEvent: (event: AgentEvent) => void,
-): Promise<"streamed" | "already_running"> {
-  const res = await fetch(url, init);
-  if (res.status === 409) return "already_running";
-  if (!res.ok) throw new Error(`Agent error: ${res.statusText}`);
-
-  const reader = res.body?.getReader();
-  if (!reader) throw new Error("No response body");
-
-  const decoder = new TextDecoder();
-  let buffer = "";
+): Promise<"streamed" | "already_running" | "no_run"> {
+  let lastId = 0;
+  let finished = false;
+
+  for (let attempt = 0; attempt <= MAX_RESUMES && !finished; attempt++) {
+    const res =
+      attempt === 0
+        ? await fetch(url, init)
+        : await fetch(eventsUrl(sessionId), {
+            headers: { "Last-Event-ID": String(lastId) },
+          });
+    if (res.status === 409) return "already_running";
+    if (res.status === 404 && attempt === 0 && url === eventsUrl(sessionId)) return "no_run";
+    if (!res.ok) throw new Error(`Agent error: ${res.statusText}`);
+
+    const reader = res.body?.getReader();
+    if (!reader) throw new Error("No response body");
+
+    const decoder = new TextDecoder();
+    let buffer = "";
+    const handle = (raw: string) => {
+      const { id, event } = parseSseChunk(raw);
+      if (id !== null) lastId = id;
+      if (!event) return;
+      if (event.type === "done" || event.type === "error") finished = true;
+      onEvent(event);
+    };
 
-  while (true) {
-    const { done, value } = await reader.read();
-    if (done) break;
-
-    buffer += decoder.decode(value, { stream: true });
-    const parts = buffer.split(/\n\n/);
-    buffer = parts.pop() ?? "";
-
-    for (const part of parts) {
-      const event = parseSseChunk(part);
-      if (event) onEvent(event);
+    try {
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const parts = buffer.split(/\n\n/);
+        buffer = parts.pop() ?? "";
+        for (const part of parts) handle(part);
+      }
+      handle(buffer);
+      // ponytail: server closed the stream cleanly — run is over even without done
+      return "streamed";
+    } catch {
+      if (attempt === MAX_RESUMES) throw new Error("Event stream disconnected");
     }
   }
-
-  const tail = parseSseChunk(buffer);
-  if (tail) onEvent(tail);
   return "streamed";
 }
 
+/** Attach to an in-flight run (e.g. after reload) and replay its events. */
+export async function attachEvents(
+  sessionId: string,
+  onEvent: (event: AgentEvent) => void,
+): Promise<"streamed" | "already_running" | "no_run"> {
+  return consumeSse(sessionId, eventsUrl(sessionId), {}, onEvent);
+}
+
 /** Resume agent on the last saved user message (no duplicate insert). */
 export async function streamRun(
   sessionId: string,
   onEvent: (event: AgentEvent) => void,
-): Promise<"streamed" | "already_running"> {
+): Promise<"streamed" | "already_running" | "no_run"> {
   return consumeSse(
+    sessionId,
     `${API_BASE}/api/sessions/${sessionId}/run`,
     { method: "POST" },
     onEvent,
@@ -140,8 +217,9 @@ export async function sendMessage(
   sessionId: string,
   content: string,
   onEvent: (event: AgentEvent) => void,
-): Promise<"streamed" | "already_running"> {
+): Promise<"streamed" | "already_running" | "no_run"> {
   return consumeSse(
+    sessionId,
     `${API_BASE}/api/sessions/${sessionId}/messages`,
     {
       method: "POST",
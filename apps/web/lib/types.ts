@@ -5,7 +5,12 @@ export type AgentEvent =
   | { type: "preview"; url: string }
   | { type: "files_changed"; paths: string[] }
   | { type: "status"; message: string }
-  | { type: "done"; usage: { input: number; output: number; cacheRead: number; cacheMiss: number } }
+  | { type: "queued"; position: number }
+  | {
+      type: "done";
+      usage: { input: number; output: number; cacheRead: number; cacheMiss: number };
+      prompt?: { before: number; after: number };
+    }
   | { type: "error"; message: string };
 
 export interface GetSessionResponse {
@@ -20,6 +25,7 @@ export interface GetSessionResponse {
     blocks?: MessageBlock[];
     created_at: string;
   }>;
+  before_cursor: string | null;
   preview_url: string | null;
   needs_run: boolean;
   agent_running: boolean;
@@ -45,3 +51,8 @@ export interface ChatMessage {
   content: string;
   blocks?: MessageBlock[];
 }
+
+/** Frames from GET /api/sessions/:id/dev-logs. */
+export type DevLogEvent =
+  | { type: "lines"; lines: string[]; dropped: number }
+  | { type: "reset" };